@@ -0,0 +1,129 @@
+# Python
+from decimal import Decimal
+# Django
+from django.db import connection, transaction
+from django.utils import timezone
+# DRF
+from rest_framework import serializers
+# Local
+from core.utils import execute_raw_query, execute_update_query
+from collection.sqls import get_collection_lock_query, get_bulk_cash_collection_query
+from delivery.utils import normalize_key
+
+# Upper bound on invoices per request, keeps the CASE statement well below MySQL's placeholder limit
+MAX_COLLECTIONS = 1000
+
+
+class CashCollectionSerializer(serializers.Serializer):
+    """Serializer for a single invoice cash collection."""
+    billing_doc_no = serializers.CharField(max_length=10)
+    cash_collection_amount = serializers.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        min_value=Decimal('0.00')
+    )
+
+
+class BulkCashCollectionSerializer(serializers.Serializer):
+    """
+    Handles atomic bulk cash collection for delivered invoices.
+    Locks and validates all invoices with one read, then writes them with one UPDATE.
+    """
+    cash_collection_latitude = serializers.DecimalField(
+        max_digits=27,
+        decimal_places=16,
+        required=False,
+        allow_null=True
+    )
+    cash_collection_longitude = serializers.DecimalField(
+        max_digits=27,
+        decimal_places=16,
+        required=False,
+        allow_null=True
+    )
+    collections = CashCollectionSerializer(many=True, allow_empty=False)
+
+    def validate_collections(self, value):
+        """Validate batch size and that all collections have unique billing_doc_no"""
+        if len(value) > MAX_COLLECTIONS:
+            raise serializers.ValidationError(f"At most {MAX_COLLECTIONS} collections are allowed per request")
+        billing_docs = [collection['billing_doc_no'] for collection in value]
+        if len(billing_docs) != len({normalize_key(billing_doc_no) for billing_doc_no in billing_docs}):
+            raise serializers.ValidationError("Duplicate billing_doc_no found in collections")
+        return value
+
+    def lock_and_validate(self, collections):
+        """
+        Locks the invoices with a single SELECT ... FOR UPDATE and checks every
+        collection against them. All problems are reported together.
+        Invoices are keyed with normalize_key, the IN list matches regardless of case under MySQL.
+        """
+        billing_docs = [collection['billing_doc_no'] for collection in collections]
+        # SQLite (used for local tests) has no row locks and rejects FOR UPDATE
+        lock_clause = "FOR UPDATE" if connection.features.has_select_for_update else ""
+        rows = execute_raw_query(get_collection_lock_query(len(billing_docs), lock_clause), billing_docs)
+        invoices = {
+            normalize_key(billing_doc_no): (delivery_status, delivery_amount, cash_collection_status)
+            for billing_doc_no, delivery_status, delivery_amount, cash_collection_status in rows
+        }
+
+        errors = {}
+        for collection in collections:
+            billing_doc_no = collection['billing_doc_no']
+            invoice = invoices.get(normalize_key(billing_doc_no))
+            if invoice is None:
+                errors[billing_doc_no] = "Delivery does not exist"
+                continue
+            delivery_status, delivery_amount, cash_collection_status = invoice
+            if not delivery_status:
+                errors[billing_doc_no] = "Delivery is not done yet"
+            elif cash_collection_status:
+                errors[billing_doc_no] = "Cash already collected"
+            elif collection['cash_collection_amount'] > Decimal(delivery_amount or 0):
+                errors[billing_doc_no] = (
+                    f"Collection amount ({collection['cash_collection_amount']}) "
+                    f"exceeds delivery amount ({delivery_amount})"
+                )
+        if errors:
+            raise serializers.ValidationError(errors)
+        return invoices
+
+    @transaction.atomic
+    def update_collections(self):
+        """Lock, validate and update all collections within a single transaction."""
+        if not self.is_valid():
+            raise serializers.ValidationError(self.errors)
+
+        validated_data = self.validated_data
+        collections = validated_data['collections']
+        invoices = self.lock_and_validate(collections)
+
+        # One CASE arm per invoice, repeated for the amount, due amount and due status columns
+        case_params = []
+        for collection in collections:
+            case_params.extend([collection['billing_doc_no'], collection['cash_collection_amount']])
+        current_time = connection.ops.adapt_datetimefield_value(timezone.now())
+        billing_docs = [collection['billing_doc_no'] for collection in collections]
+        params = (
+            case_params * 3
+            + [
+                current_time,
+                validated_data.get('cash_collection_latitude'),
+                validated_data.get('cash_collection_longitude'),
+                current_time,
+            ]
+            + billing_docs
+        )
+        execute_update_query(get_bulk_cash_collection_query(len(collections)), params)
+
+        updated_collections = []
+        for collection in collections:
+            delivery_amount = Decimal(invoices[normalize_key(collection['billing_doc_no'])][1] or 0)
+            due_amount = delivery_amount - collection['cash_collection_amount']
+            updated_collections.append({
+                'billing_doc_no': collection['billing_doc_no'],
+                'cash_collection_amount': collection['cash_collection_amount'],
+                'due_amount': due_amount,
+                'due_status': due_amount > 0,
+            })
+        return updated_collections
@@ -0,0 +1,33 @@
+def get_collection_lock_query(doc_count, lock_clause="FOR UPDATE"):
+    placeholders = ", ".join(["%s"] * doc_count)
+    COLLECTION_LOCK_QUERY = f"""
+    SELECT
+        di.billing_doc_no,
+        di.delivery_status,
+        di.delivery_amount,
+        di.cash_collection_status
+    FROM rdl_delivery_info di
+    WHERE di.billing_doc_no IN ({placeholders})
+    {lock_clause};
+    """
+    return COLLECTION_LOCK_QUERY
+
+
+def get_bulk_cash_collection_query(doc_count):
+    placeholders = ", ".join(["%s"] * doc_count)
+    amount_case = "CASE billing_doc_no " + " ".join(["WHEN %s THEN %s"] * doc_count) + " END"
+    BULK_CASH_COLLECTION_QUERY = f"""
+    UPDATE rdl_delivery_info
+    SET
+        cash_collection_amount = {amount_case},
+        due_amount = delivery_amount - {amount_case},
+        due_status = CASE WHEN delivery_amount > {amount_case} THEN 1 ELSE 0 END,
+        cash_collection_status = 1,
+        cash_collection_time = %s,
+        cash_collection_latitude = COALESCE(%s, cash_collection_latitude),
+        cash_collection_longitude = COALESCE(%s, cash_collection_longitude),
+        last_status = 'cash collection done',
+        updated_at = %s
+    WHERE billing_doc_no IN ({placeholders});
+    """
+    return BULK_CASH_COLLECTION_QUERY
@@ -0,0 +1,55 @@
+# Python
+from decimal import Decimal
+from unittest import mock
+# Django
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+# Local
+from core.models import DeliveryInfo
+from core.testing import DeliveryFixturesMixin
+from collection.serializers import BulkCashCollectionSerializer
+
+
+class BulkCashCollectionTests(DeliveryFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = cls.db_today()
+        cls.invoices = [
+            cls.create_invoice('00000001', 'P1', today, delivery_status=True, delivery_amount=Decimal('200.00'))
+            for _ in range(20)
+        ]
+
+    def collect(self, invoices, amount):
+        return BulkCashCollectionSerializer(data={
+            "collections": [
+                {"billing_doc_no": invoice.billing_doc_no, "cash_collection_amount": amount}
+                for invoice in invoices
+            ]
+        }).update_collections()
+
+    def test_statement_count_does_not_grow_with_batch(self):
+        counts = []
+        for invoices in (self.invoices[:1], self.invoices[1:20]):
+            with CaptureQueriesContext(connection) as context:
+                self.collect(invoices, "150.00")
+            counts.append(len(context.captured_queries))
+        # locking read and one UPDATE, plus the savepoint pair
+        self.assertEqual(counts, [4, 4])
+
+    def test_due_amount_is_derived_from_delivery_amount(self):
+        self.collect(self.invoices[:2], "150.00")
+        invoice = DeliveryInfo.objects.get(pk=self.invoices[0].pk)
+        self.assertTrue(invoice.cash_collection_status)
+        self.assertEqual(invoice.cash_collection_amount, Decimal('150.00'))
+        self.assertEqual(invoice.due_amount, Decimal('50.00'))
+        self.assertTrue(invoice.due_status)
+
+    def test_locked_invoices_match_regardless_of_case(self):
+        # MySQL's IN matches 'inv0000001' to 'INV0000001', the locked row must be found again in Python
+        locked = [('INV0000001', True, Decimal('200.00'), False)]
+        with mock.patch('collection.serializers.execute_raw_query', return_value=locked):
+            invoices = BulkCashCollectionSerializer().lock_and_validate(
+                [{'billing_doc_no': 'inv0000001', 'cash_collection_amount': Decimal('150.00')}]
+            )
+        self.assertEqual(list(invoices), ['INV0000001'])
@@ -0,0 +1,8 @@
+from django.urls import path
+from collection.views import (
+    BulkCashCollectionView,
+)
+
+urlpatterns = [
+    path('bulk', BulkCashCollectionView.as_view(), name='cash-collection'),
+]
@@ -0,0 +1,48 @@
+# Python
+import logging
+# DRF
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework import serializers
+# Core APP
+from core.utils import QueryTimeoutError
+from core.limits import endpoint_limits, service_unavailable_response
+# Collection APP
+from collection.serializers import BulkCashCollectionSerializer
+
+# Set up logger
+logger = logging.getLogger("collection")
+
+# API View's Starts Here
+
+class BulkCashCollectionView(APIView):
+    @endpoint_limits('cash-collection')
+    def post(self, request):
+        """
+        Records cash collection for many delivered invoices in one transaction.
+        Due amounts are derived from the delivery amount by the same UPDATE.
+        """
+        try:
+            serializer = BulkCashCollectionSerializer(data=request.data)
+            updated_collections = serializer.update_collections()
+            logger.info(f"Successfully collected cash for {len(updated_collections)} invoices")
+            return Response(
+                {"success": True, "message": "Successfully updated cash collections", "data": updated_collections},
+                status=status.HTTP_200_OK
+            )
+        except serializers.ValidationError as e:
+            logger.error(f"Validation error while updating cash collections: {e.detail}")
+            return Response(
+                {"success": False, "message": e.detail},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except QueryTimeoutError as e:
+            logger.error(f"Timeout while updating cash collections: {e}")
+            return service_unavailable_response('cash-collection', str(e))
+        except Exception as e:
+            logger.critical(f"Internal Server Error while updating cash collections: {str(e)}")
+            return Response(
+                {"success": False, "message": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -0,0 +1,84 @@
+# Python
+import logging
+import threading
+from functools import wraps
+# Django
+from django.conf import settings
+# DRF
+from rest_framework.response import Response
+from rest_framework import status
+# Core APP
+from core.utils import QueryTimeoutError, query_time_limit
+
+logger = logging.getLogger("core")
+
+DEFAULT_RETRY_AFTER = 5
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def get_endpoint_limits(endpoint):
+    """
+    Returns the limits configured for an endpoint in settings.ENDPOINT_LIMITS,
+    falling back to the global QUERY_TIMEOUT_MS and no concurrency limit.
+    """
+    limits = {
+        'query_timeout_ms': getattr(settings, 'QUERY_TIMEOUT_MS', None),
+        'max_concurrency': None,
+        'retry_after': DEFAULT_RETRY_AFTER,
+    }
+    limits.update(getattr(settings, 'ENDPOINT_LIMITS', {}).get(endpoint, {}))
+    return limits
+
+
+def service_unavailable_response(endpoint, message):
+    """Builds the early 503 response with a Retry-After header for an endpoint."""
+    response = Response(
+        {"success": False, "message": message},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = str(get_endpoint_limits(endpoint)['retry_after'])
+    return response
+
+
+def _get_semaphore(endpoint, max_concurrency):
+    """Returns the per-process semaphore guarding an endpoint, creating it once."""
+    with _semaphores_lock:
+        semaphore = _semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(max_concurrency)
+            _semaphores[endpoint] = semaphore
+        return semaphore
+
+
+def endpoint_limits(endpoint):
+    """
+    Decorator for APIView handlers applying the limits of an endpoint.
+
+    Every SELECT run by the handler gets the endpoint's execution time limit.
+    When max_concurrency is set, requests beyond it in this worker process are
+    shed straight away with a 503 instead of queueing behind slow ones.
+    Query timeouts raised by the handler are also turned into a 503.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            limits = get_endpoint_limits(endpoint)
+            semaphore = None
+            if limits['max_concurrency']:
+                semaphore = _get_semaphore(endpoint, limits['max_concurrency'])
+                if not semaphore.acquire(blocking=False):
+                    logger.warning(f"Shedding request to {endpoint}: concurrency limit {limits['max_concurrency']} reached")
+                    return service_unavailable_response(endpoint, "Server is busy, please retry shortly")
+            try:
+                with query_time_limit(limits['query_timeout_ms']):
+                    return view_method(self, request, *args, **kwargs)
+            except QueryTimeoutError as e:
+                logger.error(f"Query timeout on {endpoint}: {e}")
+                return service_unavailable_response(endpoint, str(e))
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+        return wrapper
+    return decorator
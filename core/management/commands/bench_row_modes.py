@@ -0,0 +1,88 @@
+# Python
+import time
+import tracemalloc
+# Django
+from django.core.management.base import BaseCommand
+from django.db import connection
+# Core APP
+from core.utils import (
+    build_rows,
+    stream_raw_query,
+    RESULT_MODES,
+)
+
+# Generates up to 100k rows from a digits cross join, works on MySQL and SQLite.
+# The query takes params, so literal modulo signs are written as %%
+DIGITS = "(SELECT 0 AS d UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4 " \
+         "UNION ALL SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8 UNION ALL SELECT 9)"
+BENCH_QUERY = f"""
+    SELECT
+        n AS billing_doc_no,
+        n %% 500 AS partner,
+        n %% 7 AS invoices,
+        n * 1.25 AS sales_amount,
+        n * 1.10 AS delivery_amount,
+        'partner name' AS partner_name,
+        'partner address, street, upazilla, district' AS partner_address,
+        '01700000000' AS partner_mobile
+    FROM (
+        SELECT a.d + b.d * 10 + c.d * 100 + e.d * 1000 + f.d * 10000 AS n
+        FROM {DIGITS} a, {DIGITS} b, {DIGITS} c, {DIGITS} e, {DIGITS} f
+    ) seq
+    LIMIT %s
+"""
+
+
+class Command(BaseCommand):
+    help = "Benchmarks memory and CPU of the core.utils result modes on large raw query results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 100000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def measure(self, fetch, repeat):
+        """
+        Returns best wall time and CPU time in ms over untraced runs, then peak
+        memory in MB from one separate traced run, tracemalloc slows fetching 3-4x.
+        """
+        best_wall = best_cpu = None
+        for _ in range(repeat):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            result = fetch()
+            cpu = (time.process_time() - cpu_start) * 1000
+            wall = (time.perf_counter() - wall_start) * 1000
+            del result
+            best_wall = wall if best_wall is None else min(best_wall, wall)
+            best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+
+        tracemalloc.start()
+        try:
+            result = fetch()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        del result
+        return best_wall, best_cpu, peak / (1024 * 1024)
+
+    def fetch_mode(self, mode, rows):
+        with connection.cursor() as cursor:
+            cursor.execute(BENCH_QUERY, [rows])
+            return build_rows(cursor, mode)
+
+    def fetch_stream(self, rows):
+        # Consume without keeping rows, as a streaming renderer would
+        columns, row_iter = stream_raw_query(BENCH_QUERY, [rows])
+        count = 0
+        for _ in row_iter:
+            count += 1
+        return count
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>8} {'mode':>10} {'wall ms':>10} {'cpu ms':>10} {'peak MB':>10}")
+        for rows in options['rows']:
+            for mode in RESULT_MODES:
+                wall, cpu, peak = self.measure(lambda: self.fetch_mode(mode, rows), options['repeat'])
+                self.stdout.write(f"{rows:>8} {mode:>10} {wall:>10.1f} {cpu:>10.1f} {peak:>10.2f}")
+            wall, cpu, peak = self.measure(lambda: self.fetch_stream(rows), options['repeat'])
+            self.stdout.write(f"{rows:>8} {'stream':>10} {wall:>10.1f} {cpu:>10.1f} {peak:>10.2f}")
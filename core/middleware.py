@@ -0,0 +1,46 @@
+# Django
+from django.core.exceptions import MiddlewareNotUsed
+# Core APP
+from core.slow_query import slow_query_log
+from core.profiling import profiling_enabled, should_profile, profile_request
+
+
+class SlowQueryLogMiddleware:
+    """Records slow queries for every request against the view that ran them."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        def get_view():
+            match = getattr(request, 'resolver_match', None)
+            return match.view_name if match else request.path
+
+        def get_app():
+            match = getattr(request, 'resolver_match', None)
+            return match.func.__module__.split('.')[0] if match else None
+
+        with slow_query_log(app=get_app, view=get_view):
+            return self.get_response(request)
+
+
+class RequestProfilerMiddleware:
+    """
+    Opt-in per-request profiler, see core/profiling.py.
+
+    A request is profiled when it sends `X-Profile: <PROFILER_TOKEN>` or is picked
+    by PROFILER_SAMPLE_RATE. The response then carries X-Profile-Id naming the
+    artefacts in PROFILER_DIR. One request is profiled at a time per process,
+    others are served unprofiled. With neither setting configured the middleware
+    removes itself at startup.
+    """
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        return profile_request(request, self.get_response)
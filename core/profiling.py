@@ -0,0 +1,130 @@
+# Python
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+# Django
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("core")
+
+# Longest SQL and params repr kept per timeline entry
+MAX_SQL_LENGTH = 2000
+MAX_PARAMS_LENGTH = 500
+
+# One profile at a time per process, from Python 3.12 cProfile runs on sys.monitoring
+# and a second enable() raises while another profile is active
+_profile_lock = threading.Lock()
+
+
+def _truncate(value, length):
+    return value if len(value) <= length else value[:length] + '...'
+
+
+def profiling_enabled():
+    """Profiling is configured when a privileged token or a sample rate is set."""
+    return bool(getattr(settings, 'PROFILER_TOKEN', '')) or getattr(settings, 'PROFILER_SAMPLE_RATE', 0) > 0
+
+
+def should_profile(request):
+    """A request is profiled when it sends the privileged token header or falls in the sample."""
+    token = getattr(settings, 'PROFILER_TOKEN', '')
+    header = request.META.get('HTTP_X_PROFILE')
+    if token and header and hmac.compare_digest(header, token):
+        return True
+    rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+class SQLTimeline:
+    """Execute wrapper recording when each query started and how long it ran, relative to the request."""
+
+    def __init__(self, started):
+        self.started = started
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.entries.append({
+                'start_ms': round((start - self.started) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3),
+                'sql': _truncate(' '.join(sql.split()), MAX_SQL_LENGTH),
+                'params': _truncate(repr(params), MAX_PARAMS_LENGTH),
+                'many': many,
+            })
+
+
+class RequestProfile:
+    """
+    Wraps one request in cProfile and the SQL timeline.
+
+    Writes <id>.pstats (load with pstats or snakeviz) and <id>.json holding the
+    request, its duration and the query timeline to PROFILER_DIR.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.timeline = SQLTimeline(self.started)
+
+    def run(self, get_response):
+        try:
+            self.profiler.enable()
+        except ValueError as e:
+            # Another profiling tool is active, e.g. a debugger or coverage
+            logger.warning(f"Serving {self.request.path} unprofiled: {e}")
+            return get_response(self.request)
+        try:
+            with connection.execute_wrapper(self.timeline):
+                response = get_response(self.request)
+        finally:
+            self.profiler.disable()
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        self.save(response, duration_ms)
+        return response
+
+    def save(self, response, duration_ms):
+        directory = getattr(settings, 'PROFILER_DIR', settings.BASE_DIR / 'logs' / 'profiles')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.profiler.dump_stats(os.path.join(directory, f"{self.profile_id}.pstats"))
+            with open(os.path.join(directory, f"{self.profile_id}.json"), 'w') as f:
+                json.dump({
+                    'id': self.profile_id,
+                    'method': self.request.method,
+                    'path': self.request.get_full_path(),
+                    'status': response.status_code,
+                    'duration_ms': round(duration_ms, 3),
+                    'sql_ms': round(sum(entry['duration_ms'] for entry in self.timeline.entries), 3),
+                    'queries': self.timeline.entries,
+                }, f, indent=2)
+        except OSError as e:
+            logger.error(f"Could not write profile {self.profile_id}: {e}")
+            return
+        response['X-Profile-Id'] = self.profile_id
+
+
+def profile_request(request, get_response):
+    """
+    Serves a request under RequestProfile. When another request in this process
+    is already being profiled it is served unprofiled instead, profiling never fails a request.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        logger.info(f"Serving {request.path} unprofiled: another request is being profiled")
+        return get_response(request)
+    try:
+        return RequestProfile(request).run(get_response)
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,109 @@
+# Python
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+# Django
+from django.conf import settings
+from django.db import connection
+
+# Longest params repr written to the slow log
+MAX_PARAMS_LENGTH = 1000
+# EXPLAIN statement giving a query plan per backend, bare EXPLAIN on SQLite lists bytecode
+EXPLAIN_PREFIXES = {'mysql': 'EXPLAIN', 'sqlite': 'EXPLAIN QUERY PLAN'}
+
+_state = threading.local()
+_explain_lock = threading.Lock()
+_last_explain_at = 0.0
+
+
+def _get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _explain_allowed():
+    """Samples EXPLAIN capture and rate limits it to one per interval per process."""
+    global _last_explain_at
+    if random.random() >= _get_setting('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1):
+        return False
+    with _explain_lock:
+        now = time.monotonic()
+        if now - _last_explain_at < _get_setting('SLOW_QUERY_EXPLAIN_INTERVAL', 60):
+            return False
+        _last_explain_at = now
+        return True
+
+
+def _run_explain(db_connection, sql, params):
+    """Runs EXPLAIN for a slow SELECT on a separate cursor, returns the plan rows or an error note."""
+    _state.explaining = True
+    try:
+        with db_connection.cursor() as cursor:
+            cursor.execute(f"{EXPLAIN_PREFIXES[db_connection.vendor]} {sql}", params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        _state.explaining = False
+
+
+class SlowQueryRecorder:
+    """
+    Execute wrapper timing every query on the connection.
+
+    Queries slower than SLOW_QUERY_THRESHOLD_MS are written with their params,
+    duration and calling view to logs/<app>/slow.log. A sampled, rate limited
+    subset of slow SELECTs also gets its EXPLAIN plan logged.
+    """
+
+    def __init__(self, app=None, view=None):
+        self.app = app
+        self.view = view
+        self.threshold_ms = _get_setting('SLOW_QUERY_THRESHOLD_MS', 500)
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'explaining', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold_ms:
+                self.record(sql, params, many, duration_ms, context['connection'])
+
+    def get_logger(self):
+        app = self.app() if callable(self.app) else self.app
+        return logging.getLogger(f"{app}_slow" if app else "slow_query")
+
+    def record(self, sql, params, many, duration_ms, db_connection):
+        view = self.view() if callable(self.view) else self.view
+        params_repr = repr(params)
+        if len(params_repr) > MAX_PARAMS_LENGTH:
+            params_repr = params_repr[:MAX_PARAMS_LENGTH] + '...'
+        message = f"Slow query {duration_ms:.1f}ms view={view} sql={' '.join(sql.split())} params={params_repr}"
+
+        explainable = not many and db_connection.vendor in EXPLAIN_PREFIXES and sql.lstrip()[:6].upper() == 'SELECT'
+        if explainable and _explain_allowed():
+            message += f" explain={_run_explain(db_connection, sql, params)}"
+        self.get_logger().warning(message)
+
+
+@contextmanager
+def slow_query_log(app=None, view=None):
+    """
+    Records slow queries run inside the block, ORM and core.utils raw queries alike.
+    app and view may be callables so they can be resolved lazily, e.g. after URL routing.
+    Nested blocks reuse the outer recorder.
+    """
+    if getattr(_state, 'active', False):
+        yield
+        return
+    _state.active = True
+    try:
+        with connection.execute_wrapper(SlowQueryRecorder(app=app, view=view)):
+            yield
+    finally:
+        _state.active = False
@@ -0,0 +1,105 @@
+# Python
+import itertools
+from decimal import Decimal
+# Django
+from django.db import connection
+from django.db.backends.signals import connection_created
+# Local
+from core.models import DeliveryInfo, DeliveryProductList
+
+# rpl_customer is owned by another system and has no model here, tests create a minimal copy
+CUSTOMER_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS rpl_customer (
+    partner VARCHAR(10) PRIMARY KEY,
+    name1 VARCHAR(80),
+    name2 VARCHAR(80),
+    street VARCHAR(80),
+    street1 VARCHAR(80),
+    street2 VARCHAR(80),
+    street3 VARCHAR(80),
+    post_code VARCHAR(10),
+    upazilla VARCHAR(40),
+    district VARCHAR(40),
+    mobile_no VARCHAR(15),
+    previous_due DECIMAL(20, 2)
+)
+"""
+
+
+def register_sqlite_functions(sender=None, connection=None, **kwargs):
+    """SQLite before 3.44 has no CONCAT, the list queries need it."""
+    if connection is not None and connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'CONCAT', -1, lambda *args: ''.join('' if arg is None else str(arg) for arg in args)
+        )
+
+
+connection_created.connect(register_sqlite_functions)
+
+
+class DeliveryFixturesMixin:
+    """
+    Fixtures for DeliveryInfo, DeliveryProductList and rpl_customer.
+
+    Use before TestCase in the bases so the customer table exists before the
+    class level transaction starts (DDL commits implicitly on MySQL).
+    """
+    _doc_numbers = itertools.count(1)
+
+    @classmethod
+    def setUpClass(cls):
+        connection.ensure_connection()
+        register_sqlite_functions(connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute(CUSTOMER_TABLE_SQL)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS rpl_customer")
+
+    @staticmethod
+    def db_today():
+        """Today's date as the database sees it, the list queries filter on CURRENT_DATE."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT CURRENT_DATE")
+            value = cursor.fetchone()[0]
+        return value if not isinstance(value, str) else value[:10]
+
+    @staticmethod
+    def create_customer(partner, previous_due=Decimal('0.00')):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO rpl_customer VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                [partner, 'Customer', partner, 'Road 1', 'Block A', '', '', '1207', 'Mohammadpur', 'Dhaka',
+                 '01700000000', previous_due]
+            )
+
+    @classmethod
+    def create_invoice(cls, da_code, partner, billing_date, products=2, delivery_status=False, **fields):
+        """Creates an invoice with `products` lines, each 10 units worth 95.00 plus 5.00 VAT."""
+        invoice = DeliveryInfo.objects.create(
+            billing_doc_no=f"{next(cls._doc_numbers):010d}",
+            billing_date=billing_date,
+            partner=partner,
+            da_code=da_code,
+            sales_type='01',
+            sales_amount=Decimal('100.00') * products,
+            delivery_status=delivery_status,
+            **fields
+        )
+        DeliveryProductList.objects.bulk_create([
+            DeliveryProductList(
+                billing_doc_no=invoice,
+                mtnr=f"MAT{index:04d}",
+                batch='B1',
+                tp=Decimal('9.50'),
+                vat=Decimal('5.00'),
+                sales_quantity=Decimal('10'),
+                sales_net_val=Decimal('95.00'),
+            )
+            for index in range(products)
+        ])
+        return invoice
@@ -1,3 +1,343 @@
-from django.test import TestCase
+# Python
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+# Django
+from django.db import connection, OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+# DRF
+from rest_framework.response import Response
+# Local
+from core import slow_query
+from core.limits import endpoint_limits
+from core.middleware import RequestProfilerMiddleware
+from core.slow_query import slow_query_log
+from core.testing import DeliveryFixturesMixin
+from core.utils import (
+    execute_raw_query_with_columns,
+    stream_raw_query,
+    add_execution_time_hint,
+    query_time_limit,
+    QueryTimeoutError,
+    single_flight,
+    coalescing_stats,
+    calculate_net_value,
+    ROWS_DICT,
+    ROWS_TUPLE,
+    ROWS_SLOTTED,
+    ROWS_COLUMNAR,
+)
 
-# Create your tests here.
+INVOICE_QUERY = "SELECT billing_doc_no, da_code FROM rdl_delivery_info ORDER BY billing_doc_no"
+
+
+class RawQueryResultModeTests(DeliveryFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = cls.db_today()
+        cls.docs = [cls.create_invoice('00000001', 'P1', today).billing_doc_no for _ in range(3)]
+
+    def test_result_modes_run_one_query_each(self):
+        for mode in (ROWS_DICT, ROWS_TUPLE, ROWS_SLOTTED, ROWS_COLUMNAR):
+            with self.subTest(mode=mode), self.assertNumQueries(1):
+                _, error = execute_raw_query_with_columns(INVOICE_QUERY, mode=mode)
+            self.assertIsNone(error)
+
+    def test_result_modes_hold_the_same_rows(self):
+        rows, _ = execute_raw_query_with_columns(INVOICE_QUERY)
+        self.assertEqual([row['billing_doc_no'] for row in rows], self.docs)
+
+        compact, _ = execute_raw_query_with_columns(INVOICE_QUERY, mode=ROWS_TUPLE)
+        self.assertEqual(compact['columns'], ['billing_doc_no', 'da_code'])
+        self.assertEqual([row[0] for row in compact['rows']], self.docs)
+
+        slotted, _ = execute_raw_query_with_columns(INVOICE_QUERY, mode=ROWS_SLOTTED)
+        self.assertEqual([row.billing_doc_no for row in slotted], self.docs)
+
+        columnar, _ = execute_raw_query_with_columns(INVOICE_QUERY, mode=ROWS_COLUMNAR)
+        self.assertEqual(columnar['billing_doc_no'], self.docs)
+
+    def test_unknown_mode_is_returned_as_error(self):
+        rows, error = execute_raw_query_with_columns(INVOICE_QUERY, mode='xml')
+        self.assertEqual(rows, [])
+        self.assertIsInstance(error, ValueError)
+
+    def test_stream_yields_all_rows_in_batches(self):
+        columns, rows = stream_raw_query(INVOICE_QUERY, batch_size=2)
+        self.assertEqual(columns, ['billing_doc_no', 'da_code'])
+        self.assertEqual([row[0] for row in rows], self.docs)
+
+
+class SingleFlightTests(TestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_concurrent_calls_share_one_execution(self):
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def run():
+            calls.append(1)
+            release.wait(5)
+            return ['row'], None
+
+        def call():
+            results.append(single_flight(('test', 1), run))
+
+        before = coalescing_stats()
+        leader = threading.Thread(target=call)
+        leader.start()
+        self.wait_for(lambda: calls)
+        followers = [threading.Thread(target=call) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        self.wait_for(lambda: coalescing_stats()['saved'] - before['saved'] == 3)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(coalescing_stats()['executions'] - before['executions'], 1)
+
+        # Nothing is cached once the execution finished
+        single_flight(('test', 1), run)
+        self.assertEqual(len(calls), 2)
+
+    def test_queries_inside_a_transaction_are_not_coalesced(self):
+        # TestCase runs every test in a transaction
+        before = coalescing_stats()
+        with self.assertNumQueries(1):
+            _, error = execute_raw_query_with_columns(INVOICE_QUERY, coalesce=True)
+        self.assertIsNone(error)
+        self.assertEqual(coalescing_stats(), before)
+
+
+class EndpointLimitsTests(TestCase):
+    @override_settings(ENDPOINT_LIMITS={'test-shedding': {'max_concurrency': 1, 'retry_after': 7}})
+    def test_requests_over_the_concurrency_limit_are_shed(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        class View:
+            @endpoint_limits('test-shedding')
+            def post(self, request):
+                entered.set()
+                release.wait(5)
+                return Response(status=200)
+
+        responses = []
+        first = threading.Thread(target=lambda: responses.append(View().post(None)))
+        first.start()
+        self.assertTrue(entered.wait(5))
+        shed = View().post(None)
+        release.set()
+        first.join()
+
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed['Retry-After'], '7')
+        self.assertEqual(responses[0].status_code, 200)
+        # The slot is released once the request finished
+        self.assertEqual(View().post(None).status_code, 200)
+
+
+class QueryTimeLimitTests(TestCase):
+    def test_hint_is_only_added_to_mysql_selects(self):
+        with mock.patch('core.utils.connection', SimpleNamespace(vendor='mysql')):
+            self.assertEqual(
+                add_execution_time_hint("  SELECT 1", 500), "SELECT /*+ MAX_EXECUTION_TIME(500) */ 1"
+            )
+            self.assertEqual(add_execution_time_hint("UPDATE t SET a = 1", 500), "UPDATE t SET a = 1")
+            self.assertEqual(add_execution_time_hint("SELECT 1", None), "SELECT 1")
+            # An existing hint is kept and never doubled
+            hinted = "SELECT /*+ MAX_EXECUTION_TIME(100) */ 1"
+            self.assertEqual(add_execution_time_hint(hinted, 500), hinted)
+            twice = add_execution_time_hint(add_execution_time_hint("SELECT 1", 500), 500)
+            self.assertEqual(twice.count('MAX_EXECUTION_TIME'), 1)
+        with mock.patch('core.utils.connection', SimpleNamespace(vendor='sqlite')):
+            self.assertEqual(add_execution_time_hint("SELECT 1", 500), "SELECT 1")
+
+    def test_time_limit_aborts_become_query_timeout_errors(self):
+        for code in (3024, 1205):
+            def aborted(execute, sql, params, many, context):
+                raise OperationalError(code, "Query execution was interrupted")
+
+            with self.subTest(code=code), query_time_limit(500), connection.execute_wrapper(aborted):
+                with self.assertRaises(QueryTimeoutError), connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+
+    def test_other_operational_errors_are_not_timeouts(self):
+        def failed(execute, sql, params, many, context):
+            raise OperationalError(2006, "MySQL server has gone away")
+
+        with query_time_limit(500), connection.execute_wrapper(failed):
+            with self.assertRaises(OperationalError) as raised, connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        self.assertNotIsInstance(raised.exception, QueryTimeoutError)
+
+    @override_settings(ENDPOINT_LIMITS={'test-timeout': {'retry_after': 9}})
+    def test_endpoint_limits_turns_timeouts_into_503(self):
+        class View:
+            @endpoint_limits('test-timeout')
+            def get(self, request):
+                raise QueryTimeoutError("Query exceeded its time limit")
+
+        response = View().get(None)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '9')
+
+    @override_settings(ENDPOINT_LIMITS={'delivery-list': {'retry_after': 11}})
+    def test_view_timeout_error_reaches_the_client_as_503(self):
+        timeout = ([], QueryTimeoutError("Query exceeded its time limit"))
+        with mock.patch('delivery.views.execute_raw_query_with_columns', return_value=timeout):
+            response = self.client.get(reverse('delivery-list'), {'da_code': '1', 'type': 'Done'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '11')
+        self.assertFalse(response.json()['success'])
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN_SAMPLE_RATE=0)
+class SlowQueryLogTests(DeliveryFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_invoice('00000001', 'P1', cls.db_today())
+
+    def run_query(self, view='test-view'):
+        with slow_query_log(app='delivery', view=view):
+            execute_raw_query_with_columns(INVOICE_QUERY)
+
+    def test_queries_over_the_threshold_are_logged_with_their_view(self):
+        with self.assertLogs('delivery_slow', 'WARNING') as logs:
+            self.run_query()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('view=test-view', logs.output[0])
+        self.assertIn('FROM rdl_delivery_info', logs.output[0])
+        self.assertNotIn('explain=', logs.output[0])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=60000)
+    def test_queries_under_the_threshold_are_not_logged(self):
+        with self.assertNoLogs('delivery_slow'):
+            self.run_query()
+
+    def test_slow_logger_writes_to_the_app_slow_log(self):
+        filenames = [
+            getattr(handler, 'baseFilename', '') for handler in logging.getLogger('delivery_slow').handlers
+        ]
+        self.assertIn(os.path.join('logs', 'delivery', 'slow.log'), ' '.join(filenames))
+
+    def test_middleware_logs_the_resolved_view(self):
+        with self.assertLogs('delivery_slow', 'WARNING') as logs:
+            self.client.get(reverse('delivery-list'), {'da_code': '1', 'type': 'Done'})
+        self.assertIn('view=delivery-list', logs.output[0])
+
+    @override_settings(SLOW_QUERY_EXPLAIN_SAMPLE_RATE=1, SLOW_QUERY_EXPLAIN_INTERVAL=60)
+    def test_explain_is_sampled_and_rate_limited(self):
+        with mock.patch.object(slow_query, '_last_explain_at', 0.0), \
+                self.assertLogs('delivery_slow', 'WARNING') as logs:
+            self.run_query()
+            self.run_query()
+        # The EXPLAIN itself is never logged as a slow query
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('explain=', logs.output[0])
+        # A query plan, not SQLite's bytecode listing
+        self.assertNotIn("'opcode'", logs.output[0])
+        self.assertNotIn('explain=', logs.output[1])
+
+    def test_queries_run_while_explaining_are_not_recorded(self):
+        slow_query._state.explaining = True
+        self.addCleanup(setattr, slow_query._state, 'explaining', False)
+        with self.assertNoLogs('delivery_slow'):
+            self.run_query()
+
+
+class CalculateNetValueTests(TestCase):
+    def test_split_adds_up_to_net_value(self):
+        delivery_net_val, return_net_val = calculate_net_value(
+            Decimal('5.00'), Decimal('3'), Decimal('95.00'), Decimal('2'), Decimal('1')
+        )
+        self.assertEqual(delivery_net_val + return_net_val, Decimal('100.00'))
+        self.assertEqual(delivery_net_val, Decimal('66.67'))
+
+
+class RequestProfilerTests(DeliveryFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_invoice('00000001', 'P1', cls.db_today())
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+
+    def get_list(self, **headers):
+        return self.client.get(reverse('delivery-list'), {'da_code': '1', 'type': 'Not Done'}, headers=headers)
+
+    def test_disabled_profiler_adds_nothing(self):
+        with override_settings(PROFILER_TOKEN='', PROFILER_SAMPLE_RATE=0, PROFILER_DIR=self.profile_dir):
+            response = self.get_list(x_profile='anything')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_token_header_writes_profile_and_sql_timeline(self):
+        with override_settings(PROFILER_TOKEN='secret', PROFILER_SAMPLE_RATE=0, PROFILER_DIR=self.profile_dir):
+            self.assertNotIn('X-Profile-Id', self.get_list(x_profile='wrong'))
+            response = self.get_list(x_profile='secret')
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(
+            sorted(os.listdir(self.profile_dir)), [f"{profile_id}.json", f"{profile_id}.pstats"]
+        )
+        with open(os.path.join(self.profile_dir, f"{profile_id}.json")) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['status'], 200)
+        self.assertEqual(len(summary['queries']), 1)
+        self.assertIn('rdl_delivery_info', summary['queries'][0]['sql'])
+
+    def test_concurrent_profiled_requests_never_fail(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def view(request):
+            # The first request stays in its profile until the second one finished
+            if not entered.is_set():
+                entered.set()
+                release.wait(5)
+            return HttpResponse('ok')
+
+        with override_settings(PROFILER_TOKEN='secret', PROFILER_SAMPLE_RATE=0, PROFILER_DIR=self.profile_dir):
+            middleware = RequestProfilerMiddleware(view)
+            factory = RequestFactory()
+            responses = []
+            first = threading.Thread(
+                target=lambda: responses.append(middleware(factory.get('/', HTTP_X_PROFILE='secret')))
+            )
+            first.start()
+            self.assertTrue(entered.wait(5))
+            second = middleware(factory.get('/', HTTP_X_PROFILE='secret'))
+            release.set()
+            first.join()
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotIn('X-Profile-Id', second)
+        self.assertEqual(responses[0].status_code, 200)
+        self.assertIn('X-Profile-Id', responses[0])
+
+    def test_request_is_served_when_another_profiler_is_active(self):
+        error = ValueError("Another profiling tool is already active")
+        with override_settings(PROFILER_TOKEN='secret', PROFILER_SAMPLE_RATE=0, PROFILER_DIR=self.profile_dir), \
+                mock.patch('cProfile.Profile.enable', side_effect=error):
+            response = self.get_list(x_profile='secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
@@ -1,51 +1,274 @@
-from django.db import connection
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection, OperationalError
 from rest_framework.exceptions import ValidationError
 from decimal import Decimal, ROUND_HALF_UP
 
+# Result modes for execute_raw_query_with_columns
+ROWS_DICT = 'dict'          # list of dicts, one per row
+ROWS_TUPLE = 'tuple'        # {"columns": [...], "rows": [tuple, ...]}, one shared column index
+ROWS_SLOTTED = 'slotted'    # list of namedtuples, attribute access without a per-row dict
+ROWS_COLUMNAR = 'columnar'  # {column: [values, ...]}
+RESULT_MODES = (ROWS_DICT, ROWS_TUPLE, ROWS_SLOTTED, ROWS_COLUMNAR)
 
-def execute_raw_query(query, params=None):
+# Rows pulled per round trip by stream_raw_query
+STREAM_BATCH_SIZE = 2000
+
+# MySQL error codes for statements aborted by a time limit
+# 3024: MAX_EXECUTION_TIME exceeded, 1205: innodb_lock_wait_timeout exceeded
+QUERY_TIMEOUT_ERROR_CODES = (3024, 1205)
+
+# Saved executions between the coalescing summaries written to the core log
+COALESCING_LOG_EVERY = 100
+
+logger = logging.getLogger("core")
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_coalescing_stats = {"executions": 0, "saved": 0}
+
+
+class QueryTimeoutError(Exception):
+    """Raised when the database aborts a statement that ran past its time limit."""
+
+
+def add_execution_time_hint(query, timeout_ms):
+    """
+    Adds a MAX_EXECUTION_TIME optimizer hint to a SELECT statement.
+
+    Only MySQL supports the hint and it only applies to read-only SELECTs,
+    anything else is returned unchanged. An existing hint is kept as is.
+    """
+    if not timeout_ms or connection.vendor != 'mysql':
+        return query
+    stripped = query.lstrip()
+    if stripped[:6].upper() != 'SELECT' or 'MAX_EXECUTION_TIME' in stripped:
+        return query
+    return f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{stripped[6:]}"
+
+
+def _raise_if_timeout(error):
+    """Re-raises a time limit abort from the database as QueryTimeoutError."""
+    if error.args and error.args[0] in QUERY_TIMEOUT_ERROR_CODES:
+        raise QueryTimeoutError(f"Query exceeded its time limit: {error.args[-1]}") from error
+
+
+def _execute(cursor, query, params, timeout_ms=None):
+    """Runs a query on the cursor, raising QueryTimeoutError for time limit aborts."""
+    try:
+        cursor.execute(add_execution_time_hint(query, timeout_ms), params)
+    except OperationalError as e:
+        _raise_if_timeout(e)
+        raise
+
+
+@contextmanager
+def query_time_limit(timeout_ms):
+    """
+    Applies an execution time limit to every SELECT run inside the block,
+    ORM queries included. Per-query limits passed to execute_raw_query* win.
+    """
+    if not timeout_ms:
+        yield
+        return
+
+    def wrapper(execute, sql, params, many, context):
+        try:
+            return execute(add_execution_time_hint(sql, timeout_ms), params, many, context)
+        except OperationalError as e:
+            _raise_if_timeout(e)
+            raise
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+def execute_raw_query(query, params=None, timeout_ms=None):
     """
     Executes a raw SQL query and returns the results.
 
     Args:
         query (str): SQL query to execute.
         params (list): Parameters to pass to the query.
+        timeout_ms (int): Optional execution time limit for a SELECT.
 
     Returns:
         list: List of tuples containing the query results.
     """
 
     with connection.cursor() as cursor:
-        cursor.execute(query, params)
+        _execute(cursor, query, params, timeout_ms)
         results = cursor.fetchall()
     return results
 
-def execute_raw_query_with_columns(query, params=None):
+def build_rows(cursor, mode=ROWS_DICT):
+    """
+    Fetches all rows from an executed cursor in the requested result mode.
+
+    Every mode except ROWS_DICT avoids building a dict per row, and all of
+    them are JSON renderable as is.
+    """
+    columns = [col[0] for col in cursor.description]
+    if mode == ROWS_DICT:
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    if mode == ROWS_TUPLE:
+        return {"columns": columns, "rows": cursor.fetchall()}
+    if mode == ROWS_SLOTTED:
+        row_class = namedtuple('Row', columns, rename=True)
+        return [row_class._make(row) for row in cursor.fetchall()]
+    if mode == ROWS_COLUMNAR:
+        rows = cursor.fetchall()
+        if not rows:
+            return {column: [] for column in columns}
+        return {column: list(values) for column, values in zip(columns, zip(*rows))}
+    raise ValueError(f"Unknown result mode '{mode}', expected one of {RESULT_MODES}")
+
+class _InFlightQuery:
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = ([], RuntimeError("Coalesced query was interrupted"))
+
+
+def coalescing_stats():
+    """Leader executions and executions saved by coalescing in this worker process."""
+    with _in_flight_lock:
+        return dict(_coalescing_stats)
+
+
+def single_flight(key, run):
+    """
+    Runs run() once for concurrent callers with the same key.
+
+    The first caller executes it, callers arriving while it is in flight wait
+    and get the same result object. The key is released before the result is
+    handed out, so later callers always trigger a fresh execution.
+    """
+    with _in_flight_lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _InFlightQuery()
+            _coalescing_stats["executions"] += 1
+        else:
+            _coalescing_stats["saved"] += 1
+            saved = _coalescing_stats["saved"]
+            executions = _coalescing_stats["executions"]
+
+    if not leader:
+        if saved % COALESCING_LOG_EVERY == 0:
+            logger.info(f"Query coalescing saved {saved} executions, {executions} executed")
+        flight.done.wait()
+        return flight.result
+
+    try:
+        flight.result = run()
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        flight.done.set()
+    return flight.result
+
+
+def execute_raw_query_with_columns(query, params=None, timeout_ms=None, mode=ROWS_DICT, coalesce=False):
     """
     Executes a raw SQL query and returns the results as a list of dictionaries.
 
     The returned dictionaries will have column names as keys and row values as values.
+    Pass a different mode (ROWS_TUPLE, ROWS_SLOTTED, ROWS_COLUMNAR) to skip the
+    per-row dicts on large results, see build_rows.
+
+    With coalesce=True identical concurrent calls in this process share one
+    execution and the same result object, which callers must not mutate.
+    Calls inside a transaction are never coalesced, they must see their own writes.
 
     Args:
         query (str): SQL query to execute.
         params (list): Parameters to pass to the query.
+        timeout_ms (int): Optional execution time limit for a SELECT.
+        mode (str): Result mode, one of RESULT_MODES.
+        coalesce (bool): Share the execution with identical in-flight calls.
 
     Returns:
-        list: List of dictionaries containing the query results.
+        tuple: (results, error). results holds the rows in the requested mode,
+        a list of dictionaries for ROWS_DICT, and is empty when error is set.
     """
+    if coalesce and getattr(settings, 'QUERY_COALESCING', True) and not connection.in_atomic_block:
+        key = (connection.alias, query, tuple(params or ()), timeout_ms, mode)
+        try:
+            hash(key)
+        except TypeError:
+            pass
+        else:
+            return single_flight(key, lambda: _execute_with_columns(query, params, timeout_ms, mode))
+    return _execute_with_columns(query, params, timeout_ms, mode)
+
+
+def _execute_with_columns(query, params, timeout_ms, mode):
     try:
         with connection.cursor() as cursor:
-            cursor.execute(query, params)
-            columns = [col[0] for col in cursor.description]
-            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            _execute(cursor, query, params, timeout_ms)
+            results = build_rows(cursor, mode)
         return results, None
     except Exception as e:
         return [], e
 
+def _streaming_cursor():
+    """
+    Returns a cursor that keeps the result set on the server when possible.
+
+    On MySQL this is an unbuffered SSCursor, rows are only transferred as they
+    are fetched. The connection cannot run other queries until it is exhausted.
+    """
+    if connection.vendor != 'mysql':
+        return connection.cursor()
+    from MySQLdb.cursors import SSCursor
+    from django.db.backends.mysql.base import CursorWrapper as MySQLCursorWrapper
+    connection.ensure_connection()
+    return connection.make_cursor(MySQLCursorWrapper(connection.connection.cursor(SSCursor)))
+
+def stream_raw_query(query, params=None, batch_size=STREAM_BATCH_SIZE, timeout_ms=None):
+    """
+    Executes a raw SQL query and streams its rows with fetchmany.
+
+    Args:
+        query (str): SQL query to execute.
+        params (list): Parameters to pass to the query.
+        batch_size (int): Rows fetched per round trip.
+        timeout_ms (int): Optional execution time limit for a SELECT.
+
+    Returns:
+        tuple: (columns, rows) where rows is a generator of tuples. The
+        cursor is closed once the generator is exhausted or closed.
+    """
+    cursor = _streaming_cursor()
+    try:
+        _execute(cursor, query, params, timeout_ms)
+        columns = [col[0] for col in cursor.description]
+    except Exception:
+        cursor.close()
+        raise
+
+    def rows():
+        try:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            cursor.close()
+
+    return columns, rows()
+
 def execute_update_query(query, params=None):
     """Executes an UPDATE/INSERT/DELETE and returns affected rows count."""
     with connection.cursor() as cursor:
-        cursor.execute(query, params)
+        _execute(cursor, query, params)
         return cursor.rowcount
 
 
@@ -0,0 +1,182 @@
+# Python
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+try:
+    import fcntl
+except ImportError:  # Windows development machines, rotation is then unguarded
+    fcntl = None
+# Django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+# DRF
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger("delivery")
+
+# Seconds between keep-alive comments on an idle stream, stops proxies closing it
+HEARTBEAT_SECONDS = 15
+# Reconnect delay sent to EventSource clients, in milliseconds
+RETRY_MS = 2000
+
+
+def _get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_events_path():
+    return str(_get_setting('DELIVERY_EVENTS_FILE', settings.BASE_DIR / 'logs' / 'delivery' / 'events.ndjson'))
+
+
+def build_delivery_events(delivery_infos):
+    """One progress event per DA for delivery records that were just marked done."""
+    deliveries = defaultdict(list)
+    for delivery_info in delivery_infos:
+        deliveries[delivery_info.da_code].append({
+            'billing_doc_no': delivery_info.billing_doc_no,
+            'partner': delivery_info.partner,
+            'delivery_amount': delivery_info.delivery_amount,
+            'return_amount': delivery_info.return_amount,
+            'return_status': delivery_info.return_status,
+        })
+    now = timezone.now()
+    return [
+        {'da_code': da_code, 'time': now, 'deliveries': items}
+        for da_code, items in deliveries.items()
+    ]
+
+
+def publish_delivery_events(events):
+    """
+    Appends events to the events file as NDJSON, shared by every worker process on the host.
+    All lines go out in one O_APPEND write so concurrent publishers never interleave.
+    The file is rotated to <path>.1 once it grows past DELIVERY_EVENTS_MAX_BYTES,
+    under an exclusive lock on <path>.lock so two workers never rotate twice and
+    overwrite <path>.1 before readers drained it.
+    Runs after commit, so failures are logged and never reach the request.
+    """
+    if not events:
+        return
+    path = get_events_path()
+    data = ''.join(json.dumps(event, cls=DjangoJSONEncoder) + '\n' for event in events).encode()
+    try:
+        lock_fd = os.open(f"{path}.lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                if os.path.getsize(path) > _get_setting('DELIVERY_EVENTS_MAX_BYTES', 10 * 1024 * 1024):
+                    os.replace(path, f"{path}.1")
+            except FileNotFoundError:
+                pass
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(lock_fd)
+    except OSError as e:
+        logger.error(f"Could not publish delivery events for DA codes {[event['da_code'] for event in events]}: {e}")
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+class EventFileReader:
+    """
+    Tails the events file. Event ids are "<inode>-<offset>", so a client
+    reconnecting with Last-Event-ID resumes where it stopped, also across a rotation.
+    Without an id reading starts at the end of the file.
+    """
+
+    def __init__(self, path, last_event_id=None):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        if last_event_id:
+            try:
+                self.inode, self.offset = (int(part) for part in last_event_id.split('-'))
+                return
+            except ValueError:
+                pass
+        current = _stat(path)
+        if current is not None:
+            self.inode, self.offset = current.st_ino, current.st_size
+
+    def read(self):
+        """Returns (event_id, event) pairs for the lines appended since the last read."""
+        current = _stat(self.path)
+        if current is None:
+            return []
+        events = []
+        if current.st_ino != self.inode:
+            # Rotated since the last read, finish the old file first when it is still there
+            rotated = _stat(f"{self.path}.1")
+            if self.inode is not None and rotated is not None and rotated.st_ino == self.inode:
+                events.extend(self._read_from(f"{self.path}.1"))
+            self.inode, self.offset = current.st_ino, 0
+        elif current.st_size < self.offset:
+            self.offset = 0
+        events.extend(self._read_from(self.path))
+        return events
+
+    def _read_from(self, path):
+        with open(path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        # Only complete lines, a line still being written is picked up by the next read
+        data = data[:data.rfind(b'\n') + 1]
+        events = []
+        for line in data.splitlines(keepends=True):
+            self.offset += len(line)
+            try:
+                events.append((f"{self.inode}-{self.offset}", json.loads(line)))
+            except ValueError:
+                continue
+        return events
+
+    def render(self, da_codes):
+        """New events for the DA codes, formatted as server-sent events."""
+        return ''.join(
+            f"id: {event_id}\nevent: delivery\ndata: {json.dumps(event)}\n\n"
+            for event_id, event in self.read()
+            if event.get('da_code') in da_codes
+        )
+
+
+async def stream_delivery_events(da_codes, last_event_id=None):
+    """
+    Server-sent event stream, only served under ASGI where waiting between polls
+    holds no worker or thread. Each stream is closed after DELIVERY_EVENTS_STREAM_SECONDS,
+    EventSource then reconnects with Last-Event-ID.
+    """
+    reader = EventFileReader(get_events_path(), last_event_id)
+    da_codes = set(da_codes)
+    poll_interval = _get_setting('DELIVERY_EVENTS_POLL_INTERVAL', 0.5)
+    started = last_sent = time.monotonic()
+    yield f"retry: {RETRY_MS}\n\n"
+    while time.monotonic() - started < _get_setting('DELIVERY_EVENTS_STREAM_SECONDS', 55):
+        chunk = reader.render(da_codes)
+        if chunk:
+            last_sent = time.monotonic()
+            yield chunk
+        elif time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(poll_interval)
+
+
+class EventStreamRenderer(JSONRenderer):
+    """Lets content negotiation accept EventSource requests, errors are still rendered as JSON."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
@@ -0,0 +1,52 @@
+# Python
+import time
+# Django
+from django.core.management.base import BaseCommand
+# Delivery APP
+from delivery.serializers import UpdateBulkDeliverySerializer
+from delivery.validators import compile_field
+
+
+def build_payload(deliveries, lines_per_delivery):
+    return [
+        {
+            "billing_doc_no": f"{index:010d}",
+            "delivery_products": [
+                {"mtnr": f"MAT{line:06d}", "batch": "B1", "delivery_quantity": 8, "return_quantity": "2"}
+                for line in range(lines_per_delivery)
+            ],
+        }
+        for index in range(deliveries)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks DRF's nested serializers against the compiled fast path on bulk "
+        "delivery payloads. Only field validation is timed, no database access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=100)
+        parser.add_argument('--lines', type=int, default=10, help="Product lines per delivery")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def best_of(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        payload = build_payload(options['deliveries'], options['lines'])
+        field = UpdateBulkDeliverySerializer().fields['deliveries']
+        fast = compile_field(field)
+        assert fast(payload) == field.run_validation(payload)
+
+        drf_ms = self.best_of(lambda: field.run_validation(payload), options['repeat'])
+        fast_ms = self.best_of(lambda: fast(payload), options['repeat'])
+        lines = options['deliveries'] * options['lines']
+        self.stdout.write(f"{lines} lines: DRF {drf_ms:.1f} ms, fast path {fast_ms:.1f} ms ({drf_ms / fast_ms:.1f}x)")
@@ -0,0 +1,235 @@
+# Python
+import csv
+from collections import defaultdict
+import json
+import os
+import time
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+# Core APP
+from core.utils import execute_raw_query, execute_update_query
+from core.slow_query import slow_query_log
+# Delivery APP
+from delivery.utils import normalize_da_code
+from delivery.sqls import (
+    get_upsert_query,
+    get_insert_query,
+    get_null_batch_lines_query,
+    get_update_by_id_query,
+    get_refresh_sales_amount_query,
+)
+
+# Upstream columns written to rdl_delivery_info, delivery and collection state is never touched
+HEADER_COLUMNS = [
+    'billing_doc_no', 'gate_pass_no', 'billing_date', 'billing_type', 'sales_type',
+    'partner', 'da_code', 'route_code', 'sales_amount', 'sales_org', 'delv_no',
+    'vehicle_no', 'company_code', 'assignment', 'plant', 'reference', 'order_type',
+    'item_category', 'territory_code', 'team', 'mio_name', 'mio_mobile_no',
+]
+# Upstream columns written to rdl_delivery_product_list
+LINE_COLUMNS = ['billing_doc_no', 'mtnr', 'batch', 'tp', 'vat', 'sales_quantity', 'sales_net_val', 'cancel']
+LINE_KEY_COLUMNS = ['billing_doc_no', 'mtnr', 'batch']
+# Invoices per sales_amount refresh statement
+REFRESH_CHUNK_SIZE = 1000
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield {key: (value if value != '' else None) for key, value in row.items()}
+
+
+def read_ndjson(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingests SAP billing lines (one invoice line per record, header fields repeated) "
+        "from CSV or NDJSON into rdl_delivery_info and rdl_delivery_product_list "
+        "with batched multi-row upserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file with billing lines")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Records per upsert transaction")
+        parser.add_argument('--checkpoint', help="Checkpoint file, defaults to <path>.checkpoint")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+        parser.add_argument('--no-refresh', action='store_true', help="Skip the sales_amount refresh afterwards")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        reader = read_csv if file_format == 'csv' else read_ndjson
+        batch_size = options['batch_size']
+        checkpoint_path = options['checkpoint'] or f"{path}.checkpoint"
+
+        # Records already committed by a previous run are skipped
+        skip = 0
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as f:
+                skip = int(f.read().strip() or 0)
+            self.stdout.write(f"Resuming after {skip} records from {checkpoint_path}")
+
+        self.has_sales_amount = None
+        billing_docs = set()
+        processed = skip
+        loaded = 0
+        started = time.perf_counter()
+
+        with slow_query_log(app='delivery', view='ingest_billing'):
+            batch = []
+            for index, record in enumerate(reader(path)):
+                if self.has_sales_amount is None:
+                    self.has_sales_amount = 'sales_amount' in record
+                # Invoices committed before the checkpoint are refreshed as well
+                if record.get('billing_doc_no'):
+                    billing_docs.add(record['billing_doc_no'])
+                if index < skip:
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    self.load_batch(batch)
+                    processed += len(batch)
+                    loaded += len(batch)
+                    self.write_checkpoint(checkpoint_path, processed)
+                    self.report(loaded, started)
+                    batch = []
+            if batch:
+                self.load_batch(batch)
+                processed += len(batch)
+                loaded += len(batch)
+                self.write_checkpoint(checkpoint_path, processed)
+
+            # sales_amount is derived from the lines unless upstream sent it, only for the ingested invoices
+            if billing_docs and not options['no_refresh'] and not self.has_sales_amount:
+                refresh_started = time.perf_counter()
+                docs = sorted(billing_docs)
+                refreshed = 0
+                for start in range(0, len(docs), REFRESH_CHUNK_SIZE):
+                    chunk = docs[start:start + REFRESH_CHUNK_SIZE]
+                    refreshed += execute_update_query(get_refresh_sales_amount_query(len(chunk)), chunk)
+                self.stdout.write(
+                    f"Refreshed sales_amount for {refreshed} invoices "
+                    f"in {time.perf_counter() - refresh_started:.1f}s"
+                )
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.report(loaded, started)
+        self.stdout.write(self.style.SUCCESS(f"Ingested {loaded} billing lines from {path}"))
+
+    def report(self, loaded, started):
+        elapsed = time.perf_counter() - started
+        rate = loaded / elapsed if elapsed else 0
+        self.stdout.write(f"{loaded} records in {elapsed:.1f}s ({rate:.0f} rows/s)")
+
+    def write_checkpoint(self, checkpoint_path, processed):
+        """Writes the committed record count, replacing the file atomically."""
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(processed))
+        os.replace(tmp_path, checkpoint_path)
+
+    def load_batch(self, batch):
+        """Upserts one batch of records with one statement per table in a single transaction."""
+        header_columns = [col for col in HEADER_COLUMNS if col in batch[0]]
+        line_columns = [col for col in LINE_COLUMNS if col in batch[0] or col in LINE_KEY_COLUMNS]
+        for required in ('billing_doc_no', 'billing_date', 'mtnr'):
+            if required not in batch[0]:
+                raise CommandError(f"Input is missing required column '{required}'")
+
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        # Header fields repeat on every line, the last occurrence of an invoice wins
+        headers = {}
+        lines = {}
+        for record in batch:
+            if record.get('da_code'):
+                record['da_code'] = normalize_da_code(record['da_code'])
+            headers[record['billing_doc_no']] = [record.get(col) for col in header_columns]
+            line_key = tuple(record.get(col) for col in LINE_KEY_COLUMNS)
+            lines[line_key] = [record.get(col) for col in line_columns]
+
+        header_params = []
+        for values in headers.values():
+            header_params.extend(values + [now, now])
+        # NULLs never conflict in the unique key, lines without a batch are matched separately
+        null_batch_lines = {key: values for key, values in lines.items() if key[2] is None}
+        line_params = []
+        for key, values in lines.items():
+            if key[2] is not None:
+                line_params.extend(values + [now, now])
+
+        vendor = connection.vendor
+        with transaction.atomic():
+            execute_update_query(
+                get_upsert_query(
+                    vendor,
+                    'rdl_delivery_info',
+                    header_columns + ['created_at', 'updated_at'],
+                    len(headers),
+                    ['billing_doc_no'],
+                    [col for col in header_columns if col != 'billing_doc_no'] + ['updated_at'],
+                ),
+                header_params
+            )
+            if line_params:
+                execute_update_query(
+                    get_upsert_query(
+                        vendor,
+                        'rdl_delivery_product_list',
+                        line_columns + ['created_at', 'updated_at'],
+                        len(lines) - len(null_batch_lines),
+                        LINE_KEY_COLUMNS,
+                        [col for col in line_columns if col not in LINE_KEY_COLUMNS] + ['updated_at'],
+                    ),
+                    line_params
+                )
+            if null_batch_lines:
+                self.load_null_batch_lines(null_batch_lines, line_columns, now)
+
+    def load_null_batch_lines(self, lines, line_columns, now):
+        """
+        Updates the existing batch-less lines of the invoices and inserts the missing ones,
+        one statement each. Rows are updated in place so delivery quantities survive a re-run.
+        """
+        docs = sorted({key[0] for key in lines})
+        existing = defaultdict(list)
+        for line_id, billing_doc_no, mtnr in execute_raw_query(get_null_batch_lines_query(len(docs)), docs):
+            existing[(billing_doc_no, mtnr)].append(line_id)
+
+        update_columns = [col for col in line_columns if col not in LINE_KEY_COLUMNS] + ['updated_at']
+        updates = []
+        inserts = []
+        for (billing_doc_no, mtnr, _), values in lines.items():
+            line_ids = existing.get((billing_doc_no, mtnr))
+            if line_ids:
+                row = dict(zip(line_columns, values), updated_at=now)
+                updates.extend((line_id, row) for line_id in line_ids)
+            else:
+                inserts.append(values + [now, now])
+
+        if updates:
+            update_params = []
+            for col in update_columns:
+                for line_id, row in updates:
+                    update_params.extend([line_id, row[col]])
+            update_params.extend(line_id for line_id, _ in updates)
+            execute_update_query(
+                get_update_by_id_query('rdl_delivery_product_list', update_columns, len(updates)),
+                update_params
+            )
+        if inserts:
+            execute_update_query(
+                get_insert_query('rdl_delivery_product_list', line_columns + ['created_at', 'updated_at'], len(inserts)),
+                [value for values in inserts for value in values]
+            )
@@ -8,6 +8,9 @@ from rest_framework import serializers
 # Local
 from core.models import DeliveryInfo, DeliveryProductList
 from core.utils import calculate_net_value
+from delivery.validators import FastValidationMixin, list_errors
+from delivery.utils import normalize_key, product_key
+from delivery.events import build_delivery_events, publish_delivery_events
 
 class UpdateProductListSerializer(serializers.Serializer):
     """
@@ -51,18 +54,11 @@ class UpdateDeliverySerializer(serializers.Serializer):
     billing_doc_no = serializers.CharField(max_length=10)
     delivery_products = UpdateProductListSerializer(many=True)
 
-    def validate_billing_doc_no(self, value):
-        """Validate that the delivery exists"""
-        try:
-            DeliveryInfo.objects.get(billing_doc_no=value)
-        except DeliveryInfo.DoesNotExist:
-            raise serializers.ValidationError(f"Delivery with billing_doc_no '{value}' does not exist")
-        return value
-
-class UpdateBulkDeliverySerializer(serializers.Serializer):
+class UpdateBulkDeliverySerializer(FastValidationMixin, serializers.Serializer):
     """
     Handles atomic bulk updates of deliveries and their products.
     Validates input, recalculates delivery/return amounts, and updates coordinates.
+    Payloads are validated by the compiled fast path, see delivery/validators.py.
     """
     delivery_latitude = serializers.DecimalField(
         max_digits=27, 
@@ -79,25 +75,34 @@ class UpdateBulkDeliverySerializer(serializers.Serializer):
     deliveries = UpdateDeliverySerializer(many=True)
 
     def validate_deliveries(self, value):
-        """Validate that all deliveries have unique billing_doc_no"""
+        """Validate that all deliveries have unique billing_doc_no and exist, with one query"""
         billing_docs = [delivery['billing_doc_no'] for delivery in value]
-        if len(billing_docs) != len(set(billing_docs)):
+        if len(billing_docs) != len({normalize_key(billing_doc_no) for billing_doc_no in billing_docs}):
             raise serializers.ValidationError("Duplicate billing_doc_no found in deliveries")
+
+        existing = {
+            normalize_key(billing_doc_no)
+            for billing_doc_no in DeliveryInfo.objects.filter(billing_doc_no__in=billing_docs).values_list('billing_doc_no', flat=True)
+        }
+        errors = {
+            index: {'billing_doc_no': [f"Delivery with billing_doc_no '{billing_doc_no}' does not exist"]}
+            for index, billing_doc_no in enumerate(billing_docs)
+            if normalize_key(billing_doc_no) not in existing
+        }
+        if errors:
+            raise serializers.ValidationError(list_errors(errors, len(billing_docs)))
         return value
 
-    def validate_and_update_product(self, product_data, billing_doc_no):
+    def validate_and_update_product(self, product_data, billing_doc_no, products):
         """
         Validate and update a single product
+        products maps product_key(billing_doc_no, mtnr, batch) to the rows loaded by update_deliveries,
+        codes match regardless of case like the database collation does
         Returns the updated product instance
         """
-        try:
-            # Get the existing product
-            product = DeliveryProductList.objects.get(
-                billing_doc_no=billing_doc_no,
-                mtnr=product_data['mtnr'],
-                batch=product_data.get('batch')
-            )
-        except DeliveryProductList.DoesNotExist:
+        # Get the existing product
+        product = products.get(product_key(billing_doc_no, product_data['mtnr'], product_data.get('batch')))
+        if product is None:
             raise serializers.ValidationError(
                 f"Product {product_data['mtnr']} with batch {product_data.get('batch')} "
                 f"not found for delivery {billing_doc_no}"
@@ -144,16 +149,28 @@ class UpdateBulkDeliverySerializer(serializers.Serializer):
         longitude = validated_data.get('delivery_longitude')
         deliveries_data = validated_data['deliveries']
 
+        billing_docs = [delivery_data['billing_doc_no'] for delivery_data in deliveries_data]
+
+        # Fetch and lock all delivery records with one query
+        delivery_infos = {
+            normalize_key(billing_doc_no): delivery_info
+            for billing_doc_no, delivery_info in DeliveryInfo.objects.select_for_update().in_bulk(billing_docs).items()
+        }
+        # Fetch all their products with one query
+        products = {
+            product_key(product.billing_doc_no_id, product.mtnr, product.batch): product
+            for product in DeliveryProductList.objects.filter(billing_doc_no__in=billing_docs)
+        }
+
+        current_time = timezone.now()
         updated_deliveries = []
-        
+        all_updated_products = []
+        updated_delivery_infos = []
+
         for delivery_data in deliveries_data:
             billing_doc_no = delivery_data['billing_doc_no']
-            # Fetch and lock delivery record for update
-            try:
-                delivery_info = DeliveryInfo.objects.select_for_update().get(
-                    billing_doc_no=billing_doc_no
-                )
-            except DeliveryInfo.DoesNotExist:
+            delivery_info = delivery_infos.get(normalize_key(billing_doc_no))
+            if delivery_info is None:
                 raise serializers.ValidationError(
                     f"Delivery {billing_doc_no} not found"
                 )
@@ -168,7 +185,8 @@ class UpdateBulkDeliverySerializer(serializers.Serializer):
                 # Validate and prepare updated product entry
                 product = self.validate_and_update_product(
                     product_data, 
-                    billing_doc_no
+                    billing_doc_no,
+                    products
                 )
                 
                 total_delivery_amount += product.delivery_net_val
@@ -178,22 +196,9 @@ class UpdateBulkDeliverySerializer(serializers.Serializer):
                     has_returns = True
                 
                 updated_products.append(product)
-
-            # Bulk update products
-            DeliveryProductList.objects.bulk_update(
-                updated_products,
-                [
-                    'delivery_quantity', 
-                    'return_quantity', 
-                    'delivery_net_val', 
-                    'return_net_val', 
-                    'updated_at'
-                ]
-            )
+            all_updated_products.extend(updated_products)
 
             # Update delivery info
-            current_time = timezone.now()
-            
             delivery_info.delivery_status = True
             delivery_info.delivery_time = current_time
             delivery_info.last_status = 'delivery done'
@@ -208,25 +213,47 @@ class UpdateBulkDeliverySerializer(serializers.Serializer):
                 delivery_info.delivery_latitude = latitude
             if longitude is not None:
                 delivery_info.delivery_longitude = longitude
+            updated_delivery_infos.append(delivery_info)
 
-            delivery_info.save(update_fields=[
+            updated_deliveries.append({
+                'billing_doc_no': billing_doc_no,
+                'delivery_amount': total_delivery_amount,
+                'return_amount': total_return_amount,
+                'return_status': has_returns,
+                'products_updated': len(updated_products)
+            })
+
+        # Bulk update products
+        DeliveryProductList.objects.bulk_update(
+            all_updated_products,
+            [
+                'delivery_quantity', 
+                'return_quantity', 
+                'delivery_net_val', 
+                'return_net_val', 
+                'updated_at'
+            ]
+        )
+
+        # Bulk update delivery info
+        DeliveryInfo.objects.bulk_update(
+            updated_delivery_infos,
+            [
                 'delivery_status',
                 'delivery_time', 
                 'last_status',
                 'delivery_amount',
                 'return_amount', 
                 'return_status',
+                'delivery_returned',
                 'delivery_latitude',
                 'delivery_longitude',
                 'updated_at'
-            ])
+            ]
+        )
 
-            updated_deliveries.append({
-                'billing_doc_no': billing_doc_no,
-                'delivery_amount': total_delivery_amount,
-                'return_amount': total_return_amount,
-                'return_status': has_returns,
-                'products_updated': len(updated_products)
-            })
+        # Supervisor streams only hear about deliveries once they are committed
+        events = build_delivery_events(updated_delivery_infos)
+        transaction.on_commit(lambda: publish_delivery_events(events))
 
-        return updated_deliveries
\ No newline at end of file
+        return updated_deliveries
@@ -14,4 +14,154 @@ def get_delivery_list_query(delivery_type_condition=""):
     WHERE di.billing_date=CURRENT_DATE AND di.da_code=%s AND di.sales_type!='04' {delivery_type_condition} 
     GROUP BY di.partner;
     """
-    return DELIVERY_LIST_QUERY
\ No newline at end of file
+    return DELIVERY_LIST_QUERY
+
+def get_batch_delivery_list_query(da_count, delivery_type_condition=""):
+    placeholders = ", ".join(["%s"] * da_count)
+    BATCH_DELIVERY_LIST_QUERY = f"""
+    SELECT
+        di.da_code,
+        di.partner,
+        COUNT(di.billing_doc_no) AS invoices,
+        SUM(di.sales_amount) AS sales_amount,
+        SUM(di.delivery_amount) AS delivery_amount,
+        CONCAT(c.name1,' ',c.name2) AS partner_name,
+        CONCAT(c.street,' ',c.street1,' ',c.street2,' ',c.street3,' ',c.post_code,' ',c.upazilla,' ',c.district) AS partner_address,
+        c.mobile_no AS partner_mobile,
+        c.previous_due
+    FROM rdl_delivery_info di 
+    INNER JOIN rpl_customer c ON di.partner=c.partner
+    WHERE di.billing_date=CURRENT_DATE AND di.da_code IN ({placeholders}) AND di.sales_type!='04' {delivery_type_condition} 
+    GROUP BY di.da_code, di.partner;
+    """
+    return BATCH_DELIVERY_LIST_QUERY
+
+
+def get_combined_delivery_list_query():
+    COMBINED_DELIVERY_LIST_QUERY = """
+    SELECT
+        di.partner,
+        COUNT(CASE WHEN di.delivery_status = 1 THEN 1 END) AS done_invoices,
+        SUM(CASE WHEN di.delivery_status = 1 THEN di.sales_amount END) AS done_sales_amount,
+        SUM(CASE WHEN di.delivery_status = 1 THEN di.delivery_amount END) AS done_delivery_amount,
+        COUNT(CASE WHEN di.delivery_status = 1 THEN NULL ELSE 1 END) AS pending_invoices,
+        SUM(CASE WHEN di.delivery_status = 1 THEN NULL ELSE di.sales_amount END) AS pending_sales_amount,
+        SUM(CASE WHEN di.delivery_status = 1 THEN NULL ELSE di.delivery_amount END) AS pending_delivery_amount,
+        CONCAT(c.name1,' ',c.name2) AS partner_name,
+        CONCAT(c.street,' ',c.street1,' ',c.street2,' ',c.street3,' ',c.post_code,' ',c.upazilla,' ',c.district) AS partner_address,
+        c.mobile_no AS partner_mobile,
+        c.previous_due
+    FROM rdl_delivery_info di 
+    INNER JOIN rpl_customer c ON di.partner=c.partner
+    WHERE di.billing_date=CURRENT_DATE AND di.da_code=%s AND di.sales_type!='04'
+    GROUP BY di.partner;
+    """
+    return COMBINED_DELIVERY_LIST_QUERY
+
+
+def get_partner_invoice_details_query():
+    PARTNER_INVOICE_DETAILS_QUERY = """
+    SELECT
+        di.billing_doc_no,
+        di.billing_date,
+        di.gate_pass_no,
+        di.route_code,
+        di.vehicle_no,
+        di.sales_amount,
+        di.delivery_amount,
+        di.return_amount,
+        di.delivery_status,
+        pl.mtnr,
+        pl.batch,
+        pl.tp,
+        pl.vat,
+        pl.sales_quantity,
+        pl.sales_net_val,
+        pl.delivery_quantity,
+        pl.delivery_net_val,
+        pl.return_quantity,
+        pl.return_net_val
+    FROM rdl_delivery_info di 
+    INNER JOIN rdl_delivery_product_list pl ON di.billing_doc_no=pl.billing_doc_no
+    WHERE di.billing_date=CURRENT_DATE AND di.da_code=%s AND di.partner=%s AND di.sales_type!='04'
+    ORDER BY di.billing_doc_no;
+    """
+    return PARTNER_INVOICE_DETAILS_QUERY
+
+
+def get_upsert_query(vendor, table, columns, row_count, conflict_columns, update_columns):
+    """
+    Builds a multi-row upsert.
+
+    MySQL uses INSERT ... ON DUPLICATE KEY UPDATE, SQLite (local runs and tests)
+    uses INSERT ... ON CONFLICT DO UPDATE with the same effect.
+    """
+    row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    values = ", ".join([row_placeholders] * row_count)
+    if vendor == 'mysql':
+        updates = ", ".join(f"{col}=VALUES({col})" for col in update_columns)
+        conflict_clause = f"ON DUPLICATE KEY UPDATE {updates}"
+    else:
+        updates = ", ".join(f"{col}=excluded.{col}" for col in update_columns)
+        conflict_clause = f"ON CONFLICT({', '.join(conflict_columns)}) DO UPDATE SET {updates}"
+    UPSERT_QUERY = f"""
+    INSERT INTO {table} ({', '.join(columns)})
+    VALUES {values}
+    {conflict_clause};
+    """
+    return UPSERT_QUERY
+
+
+def get_insert_query(table, columns, row_count):
+    row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    values = ", ".join([row_placeholders] * row_count)
+    INSERT_QUERY = f"""
+    INSERT INTO {table} ({', '.join(columns)})
+    VALUES {values};
+    """
+    return INSERT_QUERY
+
+
+def get_null_batch_lines_query(doc_count):
+    """Product lines without a batch, the unique key never matches them since NULLs do not conflict."""
+    placeholders = ", ".join(["%s"] * doc_count)
+    NULL_BATCH_LINES_QUERY = f"""
+    SELECT id, billing_doc_no, mtnr
+    FROM rdl_delivery_product_list
+    WHERE batch IS NULL AND billing_doc_no IN ({placeholders});
+    """
+    return NULL_BATCH_LINES_QUERY
+
+
+def get_update_by_id_query(table, columns, row_count):
+    """
+    Updates many rows by id in one statement, one CASE per column.
+    Params are (id, value) pairs per row for each column in turn, then the ids.
+    """
+    cases = " ".join(["WHEN %s THEN %s"] * row_count)
+    assignments = ",\n        ".join(f"{col} = CASE id {cases} ELSE {col} END" for col in columns)
+    placeholders = ", ".join(["%s"] * row_count)
+    UPDATE_BY_ID_QUERY = f"""
+    UPDATE {table}
+    SET {assignments}
+    WHERE id IN ({placeholders});
+    """
+    return UPDATE_BY_ID_QUERY
+
+
+def get_refresh_sales_amount_query(doc_count):
+    placeholders = ", ".join(["%s"] * doc_count)
+    REFRESH_SALES_AMOUNT_QUERY = f"""
+    UPDATE rdl_delivery_info
+    SET sales_amount = (
+        SELECT SUM(COALESCE(pl.sales_net_val, 0) + COALESCE(pl.vat, 0))
+        FROM rdl_delivery_product_list pl
+        WHERE pl.billing_doc_no = rdl_delivery_info.billing_doc_no
+    )
+    WHERE billing_doc_no IN ({placeholders})
+    AND EXISTS (
+        SELECT 1 FROM rdl_delivery_product_list pl
+        WHERE pl.billing_doc_no = rdl_delivery_info.billing_doc_no
+    );
+    """
+    return REFRESH_SALES_AMOUNT_QUERY
@@ -1,3 +1,348 @@
-from django.test import TestCase
+# Python
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+# Django
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+# Local
+from core.models import DeliveryInfo, DeliveryProductList
+from core.testing import DeliveryFixturesMixin
+from delivery.serializers import UpdateBulkDeliverySerializer
+from delivery.events import EventFileReader, publish_delivery_events
 
-# Create your tests here.
+# Payload sizes the query counts are checked at, the count must not change between them
+PAYLOAD_SIZES = [1, 5, 20]
+# Coarse latency budgets, override with env vars on slower machines
+LIST_LATENCY_BUDGET_MS = int(os.environ.get('LIST_LATENCY_BUDGET_MS', 500))
+UPDATE_LATENCY_BUDGET_MS = int(os.environ.get('UPDATE_LATENCY_BUDGET_MS', 2000))
+
+
+def build_update_payload(invoices):
+    """Delivers 8 units and returns 2 of every product line of the invoices."""
+    return {
+        "delivery_latitude": "23.7808875000000000",
+        "delivery_longitude": "90.2792371000000000",
+        "deliveries": [
+            {
+                "billing_doc_no": invoice.billing_doc_no,
+                "delivery_products": [
+                    {"mtnr": product.mtnr, "batch": product.batch, "delivery_quantity": 8, "return_quantity": 2}
+                    for product in invoice.sales_products.all()
+                ],
+            }
+            for invoice in invoices
+        ],
+    }
+
+
+class DeliveryListQueryCountTests(DeliveryFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = cls.db_today()
+        for size in PAYLOAD_SIZES:
+            da_code = f"{size:08d}"
+            for index in range(size):
+                partner = f"P{size:03d}{index:04d}"
+                cls.create_customer(partner, previous_due=Decimal('10.00'))
+                cls.create_invoice(da_code, partner, cls.today, delivery_status=True)
+                cls.create_invoice(da_code, partner, cls.today)
+
+    def test_list_runs_one_query_for_any_size(self):
+        for size in PAYLOAD_SIZES:
+            for delivery_type in ("Done", "Not Done", "All"):
+                with self.subTest(size=size, type=delivery_type), self.assertNumQueries(1):
+                    response = self.client.get(reverse('delivery-list'), {'da_code': size, 'type': delivery_type})
+                self.assertEqual(response.status_code, 200)
+
+    def test_list_returns_every_partner(self):
+        for size in PAYLOAD_SIZES:
+            response = self.client.get(reverse('delivery-list'), {'da_code': size, 'type': 'Done'})
+            self.assertEqual(len(response.json()['data']), size)
+
+        response = self.client.get(reverse('delivery-list'), {'da_code': 5, 'type': 'All'})
+        data = response.json()['data']
+        self.assertEqual(len(data['done']), 5)
+        self.assertEqual(len(data['not_done']), 5)
+        self.assertEqual(data['summary']['invoices_done'], 5)
+        self.assertEqual(data['summary']['invoices_pending'], 5)
+        # Counts must stay integers, MySQL returns DECIMAL for SUM and DRF renders that as a float
+        for value in (data['summary']['invoices_done'], data['done'][0]['invoices'], data['not_done'][0]['invoices']):
+            self.assertIs(type(value), int)
+
+    def test_batch_list_runs_one_query_for_all_da_codes(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('delivery-list-batch'),
+                {'da_codes': ','.join(str(size) for size in PAYLOAD_SIZES), 'type': 'Done'}
+            )
+        data = response.json()['data']
+        for size in PAYLOAD_SIZES:
+            self.assertEqual(data[f"{size:08d}"]['partners'], size)
+            self.assertEqual(data[f"{size:08d}"]['invoices'], size)
+
+    def test_invoice_details_runs_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('partner-invoice-details'), {'da_code': 5, 'partner': 'P0050000'}
+            )
+        invoices = response.json()['data']
+        self.assertEqual(len(invoices), 2)
+        self.assertEqual(len(invoices[0]['products']), 2)
+
+
+class UpdateDeliveriesQueryCountTests(DeliveryFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = cls.db_today()
+        cls.create_customer('P0000001')
+        cls.invoices = {
+            size: [cls.create_invoice(f"{size:08d}", 'P0000001', cls.today, products=3) for _ in range(size)]
+            for size in PAYLOAD_SIZES
+        }
+
+    def count_update_queries(self, invoices):
+        serializer = UpdateBulkDeliverySerializer(data=build_update_payload(invoices))
+        with CaptureQueriesContext(connection) as context:
+            serializer.update_deliveries()
+        return len(context.captured_queries)
+
+    def test_update_query_count_does_not_grow_with_payload(self):
+        counts = {size: self.count_update_queries(self.invoices[size]) for size in PAYLOAD_SIZES}
+        # exists check, lock, product fetch, two bulk updates, plus the savepoint pair
+        self.assertEqual(counts, {size: 7 for size in PAYLOAD_SIZES})
+
+    def test_update_persists_amounts(self):
+        invoice = self.invoices[1][0]
+        UpdateBulkDeliverySerializer(data=build_update_payload([invoice])).update_deliveries()
+
+        invoice.refresh_from_db()
+        self.assertTrue(invoice.delivery_status)
+        self.assertTrue(invoice.delivery_returned)
+        self.assertEqual(invoice.delivery_amount, Decimal('240.00'))
+        self.assertEqual(invoice.return_amount, Decimal('60.00'))
+        product = DeliveryProductList.objects.filter(billing_doc_no=invoice).first()
+        self.assertEqual(product.delivery_quantity, 8)
+        self.assertEqual(product.delivery_net_val, Decimal('80.00'))
+
+    def test_update_matches_product_codes_regardless_of_case(self):
+        # MySQL's collation compares codes case-insensitively, loaded rows must match the same way
+        invoice = self.invoices[1][0]
+        payload = build_update_payload([invoice])
+        for product in payload['deliveries'][0]['delivery_products']:
+            product['mtnr'] = product['mtnr'].lower()
+            product['batch'] = product['batch'].lower()
+        UpdateBulkDeliverySerializer(data=payload).update_deliveries()
+
+        invoice.refresh_from_db()
+        self.assertTrue(invoice.delivery_status)
+        self.assertEqual(invoice.delivery_amount, Decimal('240.00'))
+
+    def test_update_rejects_unknown_delivery_without_writing(self):
+        payload = build_update_payload(self.invoices[5])
+        payload['deliveries'][0]['billing_doc_no'] = 'UNKNOWN'
+        serializer = UpdateBulkDeliverySerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('billing_doc_no', serializer.errors['deliveries'][0])
+        self.assertFalse(DeliveryInfo.objects.filter(delivery_status=True).exists())
+
+
+class DeliveryEventsTests(DeliveryFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = cls.db_today()
+        cls.invoice = cls.create_invoice('00000001', 'P0000001', today)
+        cls.other_invoice = cls.create_invoice('00000002', 'P0000002', today)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.events_file = os.path.join(directory, 'events.ndjson')
+        settings_override = override_settings(
+            DELIVERY_EVENTS_FILE=self.events_file,
+            DELIVERY_EVENTS_POLL_INTERVAL=0.01,
+            DELIVERY_EVENTS_STREAM_SECONDS=0.1,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def parse_events(self, body):
+        return [
+            json.loads(line[len('data: '):])
+            for line in body.decode().splitlines()
+            if line.startswith('data: ')
+        ]
+
+    async def get_stream(self, params, headers=None):
+        response = await self.async_client.get(reverse('delivery-events'), params, headers=headers)
+        return response, b''.join([chunk async for chunk in response.streaming_content])
+
+    def test_committed_update_is_streamed_to_its_da_only(self):
+        payload = build_update_payload([self.invoice, self.other_invoice])
+        with self.captureOnCommitCallbacks(execute=True):
+            UpdateBulkDeliverySerializer(data=payload).update_deliveries()
+
+        start_id = f"{os.stat(self.events_file).st_ino}-0"
+        response, body = async_to_sync(self.get_stream)({'da_code': '1'}, {'last-event-id': start_id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self.parse_events(body)
+        self.assertEqual([event['da_code'] for event in events], ['00000001'])
+        self.assertEqual(events[0]['deliveries'][0]['billing_doc_no'], self.invoice.billing_doc_no)
+        self.assertEqual(events[0]['deliveries'][0]['delivery_amount'], '160.00')
+
+    def test_stream_is_refused_outside_asgi(self):
+        response = self.client.get(reverse('delivery-events'), {'da_code': '1'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_uncommitted_update_is_not_published(self):
+        UpdateBulkDeliverySerializer(data=build_update_payload([self.invoice])).update_deliveries()
+        self.assertFalse(os.path.exists(self.events_file))
+
+    def test_reader_resumes_across_rotation(self):
+        publish_delivery_events([{'da_code': '00000001', 'deliveries': []}])
+        reader = EventFileReader(self.events_file, f"{os.stat(self.events_file).st_ino}-0")
+        with self.settings(DELIVERY_EVENTS_MAX_BYTES=1):
+            publish_delivery_events([{'da_code': '00000002', 'deliveries': []}])
+        self.assertTrue(os.path.exists(f"{self.events_file}.1"))
+        self.assertEqual([event['da_code'] for _, event in reader.read()], ['00000001', '00000002'])
+        self.assertEqual(reader.read(), [])
+
+    def test_stream_only_sends_new_events(self):
+        publish_delivery_events([{'da_code': '00000001', 'deliveries': []}])
+        response, body = async_to_sync(self.get_stream)({'da_code': '1'})
+        self.assertTrue(response.is_async)
+        self.assertTrue(body.startswith(b'retry: '))
+        self.assertEqual(self.parse_events(body), [])
+
+
+class IngestBillingTests(DeliveryFixturesMixin, TestCase):
+    CSV_HEADER = "billing_doc_no,billing_date,partner,da_code,mtnr,batch,tp,vat,sales_quantity,sales_net_val\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = cls.db_today()
+        # Another invoice on the same day, its stored sales_amount must not be recomputed
+        cls.other_invoice = cls.create_invoice('00000001', 'P0000001', cls.today)
+        DeliveryInfo.objects.filter(pk=cls.other_invoice.pk).update(sales_amount=Decimal('999.00'))
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'billing.csv')
+        lines = [
+            f"9000000001,{self.today},P0000001,1,MAT1,,9.50,5.00,10,95.00",
+            f"9000000001,{self.today},P0000001,1,MAT2,B1,9.50,5.00,10,95.00",
+            f"9000000002,{self.today},P0000001,1,MAT1,,9.50,5.00,10,95.00",
+        ]
+        with open(self.path, 'w') as f:
+            f.write(self.CSV_HEADER + "\n".join(lines) + "\n")
+
+    def ingest(self, *args):
+        call_command('ingest_billing', self.path, *args, stdout=open(os.devnull, 'w'))
+
+    def test_reingesting_a_file_does_not_duplicate_lines(self):
+        self.ingest()
+        DeliveryProductList.objects.filter(billing_doc_no='9000000001', mtnr='MAT1').update(delivery_quantity=7)
+        self.ingest('--restart')
+
+        lines = DeliveryProductList.objects.filter(billing_doc_no='9000000001')
+        self.assertEqual(sorted(lines.values_list('mtnr', 'batch')), [('MAT1', None), ('MAT2', 'B1')])
+        # Batch-less lines are updated in place, delivery state survives
+        self.assertEqual(lines.get(mtnr='MAT1').delivery_quantity, 7)
+        self.assertEqual(DeliveryInfo.objects.get(pk='9000000001').sales_amount, Decimal('200.00'))
+
+    def test_resumed_ingest_refreshes_only_ingested_invoices(self):
+        self.ingest()
+        # A crash after the first batch committed, before the refresh ran
+        DeliveryInfo.objects.filter(pk='9000000001').update(sales_amount=None)
+        with open(f"{self.path}.checkpoint", 'w') as f:
+            f.write('2')
+        self.ingest('--batch-size', '1')
+
+        self.assertEqual(DeliveryInfo.objects.get(pk='9000000001').sales_amount, Decimal('200.00'))
+        self.assertEqual(DeliveryInfo.objects.get(pk='9000000002').sales_amount, Decimal('100.00'))
+        self.assertEqual(DeliveryInfo.objects.get(pk=self.other_invoice.pk).sales_amount, Decimal('999.00'))
+
+
+class FastValidationParityTests(DeliveryFixturesMixin, TestCase):
+    """The compiled validator must give the same data and errors as DRF's serializers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.invoice = cls.create_invoice('00000001', 'P0000001', cls.db_today())
+
+    def validate_both(self, payload):
+        results = []
+        for fast in (False, True):
+            with override_settings(FAST_PAYLOAD_VALIDATION=fast):
+                serializer = UpdateBulkDeliverySerializer(data=payload)
+                valid = serializer.is_valid()
+                results.append((valid, serializer.errors if not valid else serializer.validated_data))
+        return results
+
+    def test_valid_payload(self):
+        drf, fast = self.validate_both(build_update_payload([self.invoice]))
+        self.assertTrue(fast[0])
+        self.assertEqual(repr(drf), repr(fast))
+
+    def test_invalid_payloads(self):
+        product = {"mtnr": "MAT0000", "batch": "B1", "delivery_quantity": 8, "return_quantity": 2}
+        payloads = [
+            {},
+            {"deliveries": "not a list"},
+            {"deliveries": [None, 5, {}]},
+            {"delivery_latitude": "1.12345678901234567", "deliveries": []},
+            {"deliveries": [{"billing_doc_no": "UNKNOWN", "delivery_products": []}]},
+            {"deliveries": [{"billing_doc_no": self.invoice.billing_doc_no, "delivery_products": []}] * 2},
+            {"deliveries": [{"billing_doc_no": "X" * 11, "delivery_products": [
+                {**product, "delivery_quantity": -1},
+                {**product, "return_quantity": None},
+                {**product, "delivery_quantity": "1.5"},
+                {**product, "delivery_quantity": 10 ** 20},
+                {**product, "delivery_quantity": "abc"},
+                {**product, "mtnr": ""},
+                {**product, "mtnr": True},
+                {"batch": "B" * 11},
+            ]}]},
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                drf, fast = self.validate_both(payload)
+                self.assertFalse(fast[0])
+                self.assertEqual(repr(drf), repr(fast))
+
+
+@tag('latency')
+class LatencyBudgetTests(DeliveryFixturesMixin, TestCase):
+    """Coarse wall clock budgets, meant to catch order of magnitude regressions locally."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = cls.db_today()
+        cls.invoices = []
+        for index in range(200):
+            partner = f"L{index:07d}"
+            cls.create_customer(partner)
+            cls.invoices.append(cls.create_invoice('00009999', partner, cls.today, products=5))
+
+    def test_list_latency(self):
+        start = time.perf_counter()
+        response = self.client.get(reverse('delivery-list'), {'da_code': '9999', 'type': 'All'})
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed_ms, LIST_LATENCY_BUDGET_MS)
+
+    def test_update_latency(self):
+        payload = build_update_payload(self.invoices[:100])
+        start = time.perf_counter()
+        UpdateBulkDeliverySerializer(data=payload).update_deliveries()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.assertLess(elapsed_ms, UPDATE_LATENCY_BUDGET_MS)
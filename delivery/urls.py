@@ -1,8 +1,16 @@
 from django.urls import path
 from delivery.views import (
-    DeliveryListView
+    DeliveryListView,
+    BatchDeliveryListView,
+    PartnerInvoiceDetailsView,
+    DeliveryUpdateView,
+    DeliveryEventsView,
 )
 
 urlpatterns = [
     path('list', DeliveryListView.as_view(), name='delivery-list'),
+    path('list/batch', BatchDeliveryListView.as_view(), name='delivery-list-batch'),
+    path('invoices', PartnerInvoiceDetailsView.as_view(), name='partner-invoice-details'),
+    path('update', DeliveryUpdateView.as_view(), name='delivery-update'),
+    path('events', DeliveryEventsView.as_view(), name='delivery-events'),
 ]
@@ -0,0 +1,52 @@
+# Delivery APP helpers
+
+DONE_CONDITION = "AND di.delivery_status = 1"
+NOT_DONE_CONDITION = "AND (di.delivery_status != 1 OR di.delivery_status IS NULL)"
+# List type returning Done and Not Done partners together with day totals
+COMBINED_TYPE = "All"
+
+
+def normalize_da_code(da_code):
+    """Pads a DA code to the 8 digit form stored in rdl_delivery_info."""
+    return str(da_code).strip().zfill(8)
+
+
+def parse_da_codes(query_params):
+    """
+    Collects DA codes from query params.
+
+    Accepts both repeated params (?da_code=1&da_code=2) and a comma separated
+    list (?da_codes=1,2). Codes are normalised and de-duplicated, keeping order.
+    """
+    raw_codes = list(query_params.getlist('da_code'))
+    for value in query_params.getlist('da_codes'):
+        raw_codes.extend(value.split(','))
+
+    da_codes = []
+    seen = set()
+    for code in raw_codes:
+        if not code or not code.strip():
+            continue
+        code = normalize_da_code(code)
+        if code not in seen:
+            seen.add(code)
+            da_codes.append(code)
+    return da_codes
+
+
+def normalize_key(value):
+    """
+    Folds a code the way MySQL's default collation compares it, ignoring case
+    and trailing spaces, so rows loaded in bulk match payload values like a lookup would.
+    """
+    return value.rstrip().upper() if value is not None else None
+
+
+def product_key(billing_doc_no, mtnr, batch):
+    """Key of a product line, see normalize_key."""
+    return normalize_key(billing_doc_no), normalize_key(mtnr), normalize_key(batch)
+
+
+def get_delivery_type_condition(delivery_type):
+    """Returns the SQL condition for the Done / Not Done delivery list."""
+    return DONE_CONDITION if delivery_type == "Done" else NOT_DONE_CONDITION
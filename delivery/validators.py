@@ -0,0 +1,218 @@
+# Python
+import re
+from decimal import Decimal
+from collections.abc import Mapping
+# Django
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+# DRF
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import empty, get_error_detail, SkipField
+from rest_framework.settings import api_settings
+
+# Characters the CharField validators reject, only used to spot the error path
+_PROHIBITED_CHARACTERS = re.compile('[\x00\ud800-\udfff]')
+
+
+class UnsupportedSchema(Exception):
+    """Raised while compiling a serializer that has fields the fast path does not cover."""
+
+
+def use_fast_validation():
+    """The fast path is on unless disabled in settings, and off by default while debugging."""
+    return getattr(settings, 'FAST_PAYLOAD_VALIDATION', not settings.DEBUG)
+
+
+def list_errors(errors, length):
+    """Shapes per-index errors the way ListSerializer does for the installed DRF version."""
+    if getattr(api_settings, 'LIST_SERIALIZER_ERRORS_AS_DICT', False):
+        return errors
+    return [errors.get(index, {}) for index in range(length)]
+
+
+def _fail(field, key, **kwargs):
+    return ValidationError(field.error_messages[key].format(**kwargs), code=key)
+
+
+def _empty_value(field, data):
+    """Field.validate_empty_values for a missing or null value, returns the value to use."""
+    if data is empty:
+        if field.required:
+            raise _fail(field, 'required')
+        return field.get_default()
+    if not field.allow_null:
+        raise _fail(field, 'null')
+    return None
+
+
+def _compile_char(field):
+    max_length = field.max_length
+    trim_whitespace = field.trim_whitespace
+    allow_blank = field.allow_blank
+
+    def run(data):
+        if data is empty or data is None:
+            return _empty_value(field, data)
+        if type(data) is str:
+            value = data.strip() if trim_whitespace else data
+        elif isinstance(data, bool) or not isinstance(data, (int, float)):
+            raise _fail(field, 'invalid')
+        else:
+            value = str(data)
+        if value == '':
+            if not allow_blank:
+                raise _fail(field, 'blank')
+            return ''
+        # DRF collects every validator error, let it build them on the rare failing path
+        if (max_length is not None and len(value) > max_length) or _PROHIBITED_CHARACTERS.search(value):
+            field.run_validators(value)
+        return value
+    return run
+
+
+def _compile_decimal(field):
+    # Plain ints need no parsing or rounding when the field has no decimal places
+    int_fast_path = field.decimal_places == 0 and not field.validators and field.max_digits is not None
+    max_digits = field.max_digits
+    allow_null = field.allow_null
+
+    def run(data):
+        if type(data) is int and int_fast_path:
+            if len(str(abs(data))) <= max_digits:
+                return Decimal(data)
+        elif data is empty or data is None:
+            return _empty_value(field, data)
+        elif allow_null and type(data) is str and data.strip() == '':
+            return None
+        value = field.to_internal_value(data)
+        if field.validators:
+            field.run_validators(value)
+        return value
+    return run
+
+
+def _compile_list(field):
+    child = _compile_serializer(field.child, as_child=True)
+    not_a_list = field.error_messages['not_a_list']
+
+    def run(data):
+        if data is empty or data is None:
+            return _empty_value(field, data)
+        if not isinstance(data, list):
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [not_a_list.format(input_type=type(data).__name__)]
+            }, code='not_a_list')
+        if not field.allow_empty and len(data) == 0:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [field.error_messages['empty']]}, code='empty')
+        if field.max_length is not None and len(data) > field.max_length:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [field.error_messages['max_length'].format(max_length=field.max_length)]
+            }, code='max_length')
+        if field.min_length is not None and len(data) < field.min_length:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [field.error_messages['min_length'].format(min_length=field.min_length)]
+            }, code='min_length')
+
+        ret = []
+        errors = {}
+        for index, item in enumerate(data):
+            try:
+                ret.append(child(item))
+            except ValidationError as exc:
+                errors[index] = exc.detail
+        if errors:
+            raise ValidationError(list_errors(errors, len(data)))
+        return ret
+    return run
+
+
+def compile_field(field):
+    """Compiles a single serializer field into a validation function."""
+    if isinstance(field, serializers.ListSerializer):
+        return _compile_list(field)
+    if isinstance(field, serializers.DecimalField):
+        return _compile_decimal(field)
+    if isinstance(field, serializers.CharField) and type(field) is serializers.CharField:
+        return _compile_char(field)
+    raise UnsupportedSchema(f"No fast path for {type(field).__name__}")
+
+
+def _compile_serializer(serializer, as_child=False):
+    """
+    Compiles a serializer into one function with the same results and errors
+    as Serializer.run_validation, skipping DRF's per-field machinery.
+    """
+    if serializer.validators or getattr(serializer.root, 'partial', False):
+        raise UnsupportedSchema("Serializer level validators and partial updates are not supported")
+    compiled = []
+    for field in serializer._writable_fields:
+        if field.source != field.field_name:
+            raise UnsupportedSchema(f"Field {field.field_name} has a custom source")
+        compiled.append((
+            field.field_name,
+            compile_field(field),
+            getattr(serializer, 'validate_' + field.field_name, None),
+        ))
+    invalid = serializer.error_messages['invalid']
+    validate = serializer.validate
+
+    def run(data):
+        if as_child and data is None:
+            return _empty_value(serializer, data)
+        if not isinstance(data, Mapping):
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [invalid.format(datatype=type(data).__name__)]
+            }, code='invalid')
+
+        ret = {}
+        errors = {}
+        for name, run_field, validate_method in compiled:
+            try:
+                value = run_field(data.get(name, empty))
+                if validate_method is not None:
+                    value = validate_method(value)
+            except ValidationError as exc:
+                errors[name] = exc.detail
+            except DjangoValidationError as exc:
+                errors[name] = get_error_detail(exc)
+            except SkipField:
+                pass
+            else:
+                ret[name] = value
+        if errors:
+            raise ValidationError(errors)
+
+        try:
+            return validate(ret)
+        except (ValidationError, DjangoValidationError) as exc:
+            raise ValidationError(detail=serializers.as_serializer_error(exc))
+    return run
+
+
+def compile_validator(serializer):
+    """
+    Returns a fast validation function for a serializer instance, or None when
+    its schema has fields the fast path does not support.
+    """
+    try:
+        return _compile_serializer(serializer)
+    except UnsupportedSchema:
+        return None
+
+
+class FastValidationMixin:
+    """
+    Serializer mixin validating JSON payloads with a compiled fast path.
+
+    Results and error messages match DRF's nested serializers. DRF's own
+    validation runs instead when FAST_PAYLOAD_VALIDATION is off (the default
+    with DEBUG), for form data, or for schemas the fast path cannot compile.
+    """
+
+    def run_validation(self, data=empty):
+        if use_fast_validation() and type(data) is dict:
+            validator = compile_validator(self)
+            if validator is not None:
+                return validator(data)
+        return super().run_validation(data)
@@ -2,17 +2,32 @@
 import logging
 # Django
 from django.db import transaction
+from django.http import StreamingHttpResponse
 # DRF
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 # Core APP
-from core.utils import execute_raw_query, execute_raw_query_with_columns
+from core.utils import (
+    execute_raw_query,
+    execute_raw_query_with_columns,
+    QueryTimeoutError,
+    ROWS_DICT,
+    ROWS_TUPLE,
+)
+from core.limits import endpoint_limits, service_unavailable_response
 # Delivery APP
 from delivery.utils import *
-from delivery.sqls import get_delivery_list_query
+from delivery.sqls import (
+    get_delivery_list_query,
+    get_batch_delivery_list_query,
+    get_combined_delivery_list_query,
+    get_partner_invoice_details_query,
+)
 from delivery.serializers import UpdateBulkDeliverySerializer
+from delivery.events import EventStreamRenderer, stream_delivery_events
 
 # Set up logger
 logger = logging.getLogger("delivery")
@@ -20,9 +35,11 @@ logger = logging.getLogger("delivery")
 # API View's Starts Here
 
 class DeliveryListView(APIView):
+    @endpoint_limits('delivery-list')
     def get(self, request):
         """
-        Fetches delivery list for a given DA code and type (Done or Not Done)
+        Fetches delivery list for a given DA code and type (Done or Not Done).
+        With type=All both lists and the day summary are returned from a single query.
         """
         try:
             da_code = request.query_params.get('da_code', None)
@@ -34,24 +51,159 @@ class DeliveryListView(APIView):
                     {"success": False, "message": "DA code is required"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            da_code = da_code.zfill(8)
+            da_code = normalize_da_code(da_code)
+            if delivery_type == COMBINED_TYPE:
+                return self.get_combined_list(da_code)
             
-            delivery_type_query = "AND di.delivery_status = 1" if delivery_type == "Done" else "AND (di.delivery_status != 1 OR di.delivery_status IS NULL)"
+            delivery_type_query = get_delivery_type_condition(delivery_type)
             delivery_list_query = get_delivery_list_query(delivery_type_query)
             
-            # Execute query.
-            data, error = execute_raw_query_with_columns(delivery_list_query, [da_code])
+            # Execute query. The query already selects the response fields, so rows are
+            # rendered as they come back. compact=true sends one column list plus value rows.
+            # Identical lists requested at the same time share one execution.
+            result_mode = ROWS_TUPLE if request.query_params.get('compact') == 'true' else ROWS_DICT
+            data, error = execute_raw_query_with_columns(
+                delivery_list_query, [da_code], mode=result_mode, coalesce=True
+            )
             if error:
                 logger.error(f"Error while fetching delivery list for DA code: {da_code} and type: {delivery_type}: {error}")
+                if isinstance(error, QueryTimeoutError):
+                    return service_unavailable_response('delivery-list', str(error))
                 return Response(
                     {"success": False, "message": str(error)},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
-            # Process data
-            response_data = []
+            logger.info(f"Successfully fetched delivery list for DA code: {da_code} and type: {delivery_type}")
+            return Response(
+                {"success": True, "message": "Successfully fetched delivery list", "data": data},
+                status=status.HTTP_200_OK
+            )
+        except Exception as e:
+            logger.critical(f"Internal Server Error while fetching delivery list for DA code: {da_code} and type: {delivery_type}: {str(e)}")
+            return Response(
+                {"success": False, "message": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def get_combined_list(self, da_code):
+        """
+        Builds the Done and Not Done partner lists plus day level totals
+        from one conditional aggregation over today's invoices.
+        """
+        data, error = execute_raw_query_with_columns(get_combined_delivery_list_query(), [da_code], coalesce=True)
+        if error:
+            logger.error(f"Error while fetching combined delivery list for DA code: {da_code}: {error}")
+            if isinstance(error, QueryTimeoutError):
+                return service_unavailable_response('delivery-list', str(error))
+            return Response(
+                {"success": False, "message": str(error)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        done_list = []
+        pending_list = []
+        summary = {
+            "invoices_done": 0,
+            "invoices_pending": 0,
+            "sales_amount": 0,
+            "delivery_amount": 0,
+            "previous_due": 0,
+        }
+        for item in data:
+            for prefix, target in (('done', done_list), ('pending', pending_list)):
+                if not item[f'{prefix}_invoices']:
+                    continue
+                target.append(
+                    {
+                        "partner": item['partner'],
+                        "invoices": item[f'{prefix}_invoices'],
+                        "sales_amount": item[f'{prefix}_sales_amount'],
+                        "delivery_amount": item[f'{prefix}_delivery_amount'],
+                        "partner_name": item['partner_name'],
+                        "partner_address": item['partner_address'],
+                        "partner_mobile": item['partner_mobile'],
+                        "previous_due": item['previous_due']
+                    }
+                )
+
+            summary["invoices_done"] += item['done_invoices'] or 0
+            summary["invoices_pending"] += item['pending_invoices'] or 0
+            summary["sales_amount"] += (item['done_sales_amount'] or 0) + (item['pending_sales_amount'] or 0)
+            summary["delivery_amount"] += (item['done_delivery_amount'] or 0) + (item['pending_delivery_amount'] or 0)
+            summary["previous_due"] += item['previous_due'] or 0
+
+        logger.info(f"Successfully fetched combined delivery list for DA code: {da_code}")
+        return Response(
+            {
+                "success": True,
+                "message": "Successfully fetched delivery list",
+                "data": {"done": done_list, "not_done": pending_list, "summary": summary}
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class BatchDeliveryListView(APIView):
+    # Upper bound on DA codes per request, keeps the IN list and payload sane.
+    MAX_DA_CODES = 100
+
+    @endpoint_limits('delivery-list-batch')
+    def get(self, request):
+        """
+        Fetches delivery lists for many DA codes in a single query.
+        Results are keyed by DA code with per-DA totals computed in the same pass.
+        """
+        da_codes = []
+        delivery_type = None
+        try:
+            da_codes = parse_da_codes(request.query_params)
+            delivery_type = request.query_params.get('type', None)
+
+            # Validate query parameters
+            if not da_codes:
+                return Response(
+                    {"success": False, "message": "At least one DA code is required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if len(da_codes) > self.MAX_DA_CODES:
+                return Response(
+                    {"success": False, "message": f"At most {self.MAX_DA_CODES} DA codes are allowed per request"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            delivery_type_query = get_delivery_type_condition(delivery_type)
+            batch_query = get_batch_delivery_list_query(len(da_codes), delivery_type_query)
+
+            # Execute query.
+            data, error = execute_raw_query_with_columns(batch_query, da_codes)
+            if error:
+                logger.error(f"Error while fetching batch delivery list for DA codes: {da_codes} and type: {delivery_type}: {error}")
+                if isinstance(error, QueryTimeoutError):
+                    return service_unavailable_response('delivery-list-batch', str(error))
+                return Response(
+                    {"success": False, "message": str(error)},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
+            # Group rows by DA and accumulate totals in one pass
+            response_data = {
+                code: {
+                    "partners": 0,
+                    "invoices": 0,
+                    "sales_amount": 0,
+                    "delivery_amount": 0,
+                    "data": [],
+                }
+                for code in da_codes
+            }
             for item in data:
-                response_data.append(
+                da_data = response_data[item['da_code']]
+                da_data["partners"] += 1
+                da_data["invoices"] += item['invoices']
+                da_data["sales_amount"] += item['sales_amount'] or 0
+                da_data["delivery_amount"] += item['delivery_amount'] or 0
+                da_data["data"].append(
                     {
                         "partner": item['partner'],
                         "invoices": item['invoices'],
@@ -63,13 +215,176 @@ class DeliveryListView(APIView):
                         "previous_due": item['previous_due']
                     }
                 )
-            logger.info(f"Successfully fetched delivery list for DA code: {da_code} and type: {delivery_type}")
+            logger.info(f"Successfully fetched batch delivery list for {len(da_codes)} DA codes and type: {delivery_type}")
             return Response(
                 {"success": True, "message": "Successfully fetched delivery list", "data": response_data},
                 status=status.HTTP_200_OK
             )
         except Exception as e:
-            logger.critical(f"Internal Server Error while fetching delivery list for DA code: {da_code} and type: {delivery_type}: {str(e)}")
+            logger.critical(f"Internal Server Error while fetching batch delivery list for DA codes: {da_codes} and type: {delivery_type}: {str(e)}")
+            return Response(
+                {"success": False, "message": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class PartnerInvoiceDetailsView(APIView):
+    @endpoint_limits('partner-invoice-details')
+    def get(self, request):
+        """
+        Fetches today's invoices and their product lines for a DA and partner.
+        Rows come from a single JOIN and are grouped per invoice in one pass.
+        """
+        da_code = None
+        partner = None
+        try:
+            da_code = request.query_params.get('da_code', None)
+            partner = request.query_params.get('partner', None)
+
+            # Validate query parameters
+            if da_code is None or partner is None:
+                return Response(
+                    {"success": False, "message": "DA code and partner are required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            da_code = normalize_da_code(da_code)
+
+            # Execute query.
+            data, error = execute_raw_query_with_columns(get_partner_invoice_details_query(), [da_code, partner])
+            if error:
+                logger.error(f"Error while fetching invoice details for DA code: {da_code} and partner: {partner}: {error}")
+                if isinstance(error, QueryTimeoutError):
+                    return service_unavailable_response('partner-invoice-details', str(error))
+                return Response(
+                    {"success": False, "message": str(error)},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
+            # Rows are ordered by billing_doc_no, so a new invoice starts whenever it changes
+            response_data = []
+            invoice = None
+            for item in data:
+                if invoice is None or invoice['billing_doc_no'] != item['billing_doc_no']:
+                    invoice = {
+                        "billing_doc_no": item['billing_doc_no'],
+                        "billing_date": item['billing_date'],
+                        "gate_pass_no": item['gate_pass_no'],
+                        "route_code": item['route_code'],
+                        "vehicle_no": item['vehicle_no'],
+                        "sales_amount": item['sales_amount'],
+                        "delivery_amount": item['delivery_amount'],
+                        "return_amount": item['return_amount'],
+                        "delivery_status": bool(item['delivery_status']),
+                        "products": []
+                    }
+                    response_data.append(invoice)
+                invoice['products'].append(
+                    {
+                        "mtnr": item['mtnr'],
+                        "batch": item['batch'],
+                        "tp": item['tp'],
+                        "vat": item['vat'],
+                        "sales_quantity": item['sales_quantity'],
+                        "sales_net_val": item['sales_net_val'],
+                        "delivery_quantity": item['delivery_quantity'],
+                        "delivery_net_val": item['delivery_net_val'],
+                        "return_quantity": item['return_quantity'],
+                        "return_net_val": item['return_net_val']
+                    }
+                )
+            logger.info(f"Successfully fetched invoice details for DA code: {da_code} and partner: {partner}")
+            return Response(
+                {"success": True, "message": "Successfully fetched invoice details", "data": response_data},
+                status=status.HTTP_200_OK
+            )
+        except Exception as e:
+            logger.critical(f"Internal Server Error while fetching invoice details for DA code: {da_code} and partner: {partner}: {str(e)}")
+            return Response(
+                {"success": False, "message": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class DeliveryUpdateView(APIView):
+    @endpoint_limits('delivery-update')
+    def post(self, request):
+        """
+        Marks deliveries as done and updates their product quantities in one transaction.
+        Guarded by a per-process concurrency limit so bulk updates cannot starve the worker pool.
+        """
+        try:
+            serializer = UpdateBulkDeliverySerializer(data=request.data)
+            updated_deliveries = serializer.update_deliveries()
+            logger.info(f"Successfully updated {len(updated_deliveries)} deliveries")
+            return Response(
+                {"success": True, "message": "Successfully updated deliveries", "data": updated_deliveries},
+                status=status.HTTP_200_OK
+            )
+        except serializers.ValidationError as e:
+            logger.error(f"Validation error while updating deliveries: {e.detail}")
+            return Response(
+                {"success": False, "message": e.detail},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except QueryTimeoutError as e:
+            logger.error(f"Timeout while updating deliveries: {e}")
+            return service_unavailable_response('delivery-update', str(e))
+        except Exception as e:
+            logger.critical(f"Internal Server Error while updating deliveries: {str(e)}")
+            return Response(
+                {"success": False, "message": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class DeliveryEventsView(APIView):
+    # Upper bound on DA codes per stream, same as the batch list.
+    MAX_DA_CODES = 100
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        """
+        Streams delivery progress for DA codes as server-sent events.
+        An event is sent per DA whenever a bulk delivery update commits, so supervisor
+        screens no longer poll the list endpoint. Streams are time boxed and resume
+        from Last-Event-ID, the header or the last_event_id query parameter.
+        Only served under ASGI, a sync worker would be tied up for the whole stream,
+        so other requests get a 503 and should poll the list endpoint instead.
+        """
+        da_codes = []
+        try:
+            da_codes = parse_da_codes(request.query_params)
+
+            # Validate query parameters
+            if not da_codes:
+                return Response(
+                    {"success": False, "message": "At least one DA code is required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if len(da_codes) > self.MAX_DA_CODES:
+                return Response(
+                    {"success": False, "message": f"At most {self.MAX_DA_CODES} DA codes are allowed per request"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # ASGI requests carry their scope
+            if not hasattr(request, 'scope'):
+                logger.warning(f"Refused delivery event stream for DA codes: {da_codes}: not served by ASGI")
+                return service_unavailable_response(
+                    'delivery-events', "Event streams need the ASGI server, poll the delivery list instead"
+                )
+
+            last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+            response = StreamingHttpResponse(
+                stream_delivery_events(da_codes, last_event_id), content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            # Stops nginx buffering the stream
+            response['X-Accel-Buffering'] = 'no'
+            logger.info(f"Started delivery event stream for DA codes: {da_codes}")
+            return response
+        except Exception as e:
+            logger.critical(f"Internal Server Error while starting delivery event stream for DA codes: {da_codes}: {str(e)}")
             return Response(
                 {"success": False, "message": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     # My Apps
     'core',
     'delivery',
+    'collection',
 ]
 
 MIDDLEWARE = [
@@ -49,6 +50,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.SlowQueryLogMiddleware',
+    'core.middleware.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'odms_api.urls'
@@ -76,6 +79,10 @@ CORS_ALLOW_ALL_ORIGINS = env.list("CORS_ALLOW_ALL_ORIGINS")
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Session wide backstops, endpoints can tighten these via ENDPOINT_LIMITS below
+QUERY_TIMEOUT_MS = env.int('QUERY_TIMEOUT_MS', default=30000)
+LOCK_WAIT_TIMEOUT = env.int('LOCK_WAIT_TIMEOUT', default=10)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -84,9 +91,77 @@ DATABASES = {
         'PASSWORD': env('DEFAULT_DB_PASSWORD'),
         'HOST': env('DEFAULT_DB_HOST'),
         'PORT': env('DEFAULT_DB_PORT'),
+        'OPTIONS': {
+            'init_command': (
+                f"SET SESSION max_execution_time={QUERY_TIMEOUT_MS}, "
+                f"innodb_lock_wait_timeout={LOCK_WAIT_TIMEOUT}"
+            ),
+        },
     }
 }
 
+# Query time limits and admission control
+# query_timeout_ms: MAX_EXECUTION_TIME applied to every SELECT run by the endpoint
+# max_concurrency: requests allowed in flight per worker process, extra ones get 503.
+#   The limit is per process, the whole server allows workers x max_concurrency. It only
+#   engages with workers that run requests concurrently (the ASGI workers in the Dockerfile,
+#   or gthread); a sync gunicorn worker never has more than one request in flight
+# retry_after: seconds sent back in the Retry-After header with a 503
+ENDPOINT_LIMITS = {
+    'delivery-list': {'query_timeout_ms': env.int('DELIVERY_LIST_TIMEOUT_MS', default=5000)},
+    'delivery-list-batch': {'query_timeout_ms': env.int('DELIVERY_LIST_BATCH_TIMEOUT_MS', default=10000)},
+    'partner-invoice-details': {'query_timeout_ms': env.int('PARTNER_INVOICE_DETAILS_TIMEOUT_MS', default=5000)},
+    'delivery-update': {
+        'query_timeout_ms': env.int('DELIVERY_UPDATE_TIMEOUT_MS', default=10000),
+        'max_concurrency': env.int('DELIVERY_UPDATE_MAX_CONCURRENCY', default=4),
+        'retry_after': 5,
+    },
+    'cash-collection': {
+        'query_timeout_ms': env.int('CASH_COLLECTION_TIMEOUT_MS', default=10000),
+        'max_concurrency': env.int('CASH_COLLECTION_MAX_CONCURRENCY', default=4),
+        'retry_after': 5,
+    },
+    # Event streams are refused outside ASGI, clients fall back to polling
+    'delivery-events': {'retry_after': 30},
+}
+
+
+# Identical list queries running at the same time in one worker process share a single
+# execution, see single_flight in core/utils.py
+QUERY_COALESCING = env.bool('QUERY_COALESCING', default=True)
+
+
+# Slow query log, see core/slow_query.py
+# Queries slower than the threshold go to logs/<app>/slow.log, a sampled subset
+# of slow SELECTs also gets an EXPLAIN, at most one per interval (seconds) per process
+SLOW_QUERY_THRESHOLD_MS = env.int('SLOW_QUERY_THRESHOLD_MS', default=500)
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = env.float('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', default=0.1)
+SLOW_QUERY_EXPLAIN_INTERVAL = env.int('SLOW_QUERY_EXPLAIN_INTERVAL', default=60)
+
+
+# Bulk delivery payloads are validated by a compiled fast path, see delivery/validators.py
+# Off while debugging so DRF's own serializers run
+FAST_PAYLOAD_VALIDATION = env.bool('FAST_PAYLOAD_VALIDATION', default=not DEBUG)
+
+
+# Opt-in request profiler, see core/profiling.py
+# Requests sending `X-Profile: <PROFILER_TOKEN>`, plus a sampled fraction of all
+# requests, are profiled to PROFILER_DIR. Leave both unset to disable it entirely
+PROFILER_TOKEN = env('PROFILER_TOKEN', default='')
+PROFILER_SAMPLE_RATE = env.float('PROFILER_SAMPLE_RATE', default=0.0)
+PROFILER_DIR = BASE_DIR / 'logs' / 'profiles'
+
+
+# Delivery progress events, see delivery/events.py
+# Committed bulk updates are appended to an NDJSON file shared by all workers on the host
+# and tailed by the server-sent event streams, which are only served under ASGI (see the
+# Dockerfile). Streams close after DELIVERY_EVENTS_STREAM_SECONDS and clients reconnect
+# with Last-Event-ID
+DELIVERY_EVENTS_FILE = BASE_DIR / 'logs' / 'delivery' / 'events.ndjson'
+DELIVERY_EVENTS_MAX_BYTES = env.int('DELIVERY_EVENTS_MAX_BYTES', default=10 * 1024 * 1024)
+DELIVERY_EVENTS_POLL_INTERVAL = env.float('DELIVERY_EVENTS_POLL_INTERVAL', default=0.5)
+DELIVERY_EVENTS_STREAM_SECONDS = env.int('DELIVERY_EVENTS_STREAM_SECONDS', default=55)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -230,6 +305,14 @@ def create_app_handlers(app_name):
             'maxBytes': 5 * 1024 * 1024,
             'backupCount': 5,
         },
+        f'{app_name}_slow': {
+            'level': 'WARNING',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'logs' / app_name / 'slow.log',
+            'formatter': 'standard',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+        },
     }
 
 # ------------------------------
@@ -249,6 +332,11 @@ for app in apps:
         'level': 'INFO',
         'propagate': False
     }
+    loggers[f'{app}_slow'] = {
+        'handlers': [f'{app}_slow'],
+        'level': 'WARNING',
+        'propagate': False
+    }
 
 # ------------------------------
 # Final LOGGING config
@@ -0,0 +1,30 @@
+"""
+Settings for running the test suite.
+
+Runs against SQLite by default:
+    python manage.py test --settings=odms_api.test_settings
+
+Set TEST_DB=mysql to use the MySQL database configured in .env instead,
+e.g. a containerised MySQL. Latency budget checks are tagged 'latency'
+and can be skipped with --exclude-tag=latency.
+"""
+import os
+
+USE_SQLITE = os.environ.get('TEST_DB', 'sqlite') == 'sqlite'
+
+os.environ.setdefault('SECRET_KEY', 'odms-api-test')
+os.environ.setdefault('ALLOWED_HOSTS', 'localhost,testserver')
+os.environ.setdefault('CORS_ALLOW_ALL_ORIGINS', 'localhost')
+if USE_SQLITE:
+    for name in ('DEFAULT_DB_NAME', 'DEFAULT_DB_USER', 'DEFAULT_DB_PASSWORD', 'DEFAULT_DB_HOST', 'DEFAULT_DB_PORT'):
+        os.environ.setdefault(name, '')
+
+from odms_api.settings import *  # noqa: E402,F401,F403
+
+if USE_SQLITE:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'test.sqlite3',
+        }
+    }
@@ -4,4 +4,5 @@ from django.urls import path, include
 urlpatterns = [
     # path('admin/', admin.site.urls),
     path('api/v1/delivery/', include('delivery.urls')),
+    path('api/v1/collection/', include('collection.urls')),
 ]